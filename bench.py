@@ -0,0 +1,84 @@
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+from pathlib import Path
+
+from src import db as kvs_db
+
+# --- 辅助函数 ---
+
+def make_dictionary(size_mb: float) -> dict:
+    """生成一个中英文混排、编码后约 size_mb MB 的命令词典。"""
+    rng = random.Random(42)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10))) for _ in range(2000)]
+    notes = ["查看", "监听端口", "进程", "详细显示", "递归删除", "远程分支", "压缩", "权限", "日志", "网络"]
+    target = int(size_mb * 1024 * 1024)
+    db, size, n = {}, 0, 0
+    while size < target:
+        cmd = f"{rng.choice(words)}{n}"
+        examples = []
+        for _ in range(rng.randint(1, 20)):
+            usage = f"{cmd} " + " ".join(f"--{rng.choice(words)}" for _ in range(rng.randint(1, 6)))
+            note = "".join(rng.choices(notes, k=rng.randint(1, 4)))
+            examples.append({"usage": usage, "note": note})
+            size += len(usage) + len(note.encode("utf-8")) + 30
+        db[cmd] = {"name": rng.choice(notes), "tags": rng.sample(words[:50], k=rng.randint(0, 3)), "examples": examples}
+        n += 1
+    return db
+
+def timed(func, repeat: int) -> float:
+    """返回 repeat 次调用中最快的一次耗时（秒）。"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# --- 基准测试 ---
+
+def run_bench(size_mb: float, repeat: int):
+    """对每个可用的编解码器测量保存、加载与类型化加载的吞吐量。"""
+    print(f"生成约 {size_mb} MB 的测试词典 ...")
+    data = make_dictionary(size_mb)
+    print(f"主命令数: {len(data)}，可用编解码器: {', '.join(kvs_db.AVAILABLE_CODECS)}\n")
+
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, "commands.json")
+    print(f"{'codec':<8} {'format':<8} {'size(MB)':>9} {'save(MB/s)':>11} {'load(MB/s)':>11} {'typed(MB/s)':>12}")
+    try:
+        for codec in kvs_db.AVAILABLE_CODECS:
+            os.environ["KVS_JSON_CODEC"] = codec
+            for pretty in (False, True):
+                def save():
+                    with open(path, "wb") as f:
+                        f.write(kvs_db.encode_json(data, pretty=pretty, codec=codec))
+
+                def load():
+                    with open(path, "rb") as f:
+                        kvs_db.decode_json(f.read(), codec=codec)
+
+                save_s = timed(save, repeat)
+                mb = os.path.getsize(path) / 1024 / 1024
+                load_s = timed(load, repeat)
+                typed = "-"
+                if not pretty:
+                    typed_s = timed(lambda: kvs_db.load_db_typed(Path(path), codec=codec), repeat)
+                    typed = f"{mb / typed_s:.1f}"
+                fmt = "pretty" if pretty else "compact"
+                print(f"{codec:<8} {fmt:<8} {mb:>9.1f} {mb / save_s:>11.1f} {mb / load_s:>11.1f} {typed:>12}")
+    finally:
+        os.environ.pop("KVS_JSON_CODEC", None)
+        for name in os.listdir(temp_dir):
+            os.remove(os.path.join(temp_dir, name))
+        os.rmdir(temp_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KVS JSON codec benchmark")
+    parser.add_argument("--size-mb", type=float, default=50, help="Approximate dictionary size in MB (default: 50)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per measurement, best is reported (default: 3)")
+    args = parser.parse_args()
+    run_bench(args.size_mb, args.repeat)
@@ -1,5 +1,7 @@
 # src/cli.py
 import sys
+import time
+import shutil
 import argparse
 import pyperclip # pip install pyperclip
 from rich.prompt import Prompt, Confirm # From rich library
@@ -7,17 +9,75 @@ from rich.console import Console # For simple messages
 from rich.panel import Panel # 新增这行
 
 
-from src.db import load_db, save_db
-from src.core import (
-    add_command, update_command_name, update_command_tags, delete_usage, 
-    find_commands, get_command_examples, get_usage_by_index, edit_usage,
-    import_data, export_data
+from src.store import KVSStore
+from src.errors import KVSError, DatabaseCorruptError, HistoryRecordError, CommandNotFoundError, UsageNotFoundError
+from src.fsck import check_db_file
+from src.core import find_commands, get_usage_by_index, resolve_usage_index, export_data
+from src.stats import (
+    record_access, load_scores, sort_commands_by_frecency, sort_examples_by_frecency,
+    sort_results_by_frecency
 )
+from src.picker import run_picker
 from src.display import (
     show_main_cmds, show_cmd_examples, show_add_result, show_find_results, 
-    show_help, show_success, show_warning, show_error, console
+    show_help, show_success, show_warning, show_error, show_cached_listing, show_fsck_report,
+    show_history_log, console
 )
 
+def copy_usage(cmd: str, usage: str):
+    try:
+        pyperclip.copy(usage)
+        record_access([(cmd, usage)])
+        show_success(f"用法 '[cyan]{usage}[/cyan]' 已复制到剪贴板！")
+    except pyperclip.PyperclipException as e:
+        show_error(f"复制到剪贴板失败: {e}\n请确保您的系统安装了剪贴板工具（例如 Linux 上的 xclip 或 xsel）。")
+
+def prompt_new_usage(usage_obj: dict) -> tuple[str, str]:
+    new_usage = Prompt.ask(f"新用法示例 (当前: [cyan]{usage_obj.get('usage','')}[/cyan])", 
+                           default=usage_obj.get('usage',''))
+    new_note = Prompt.ask(f"新备注说明 (当前: [grey70]{usage_obj.get('note') or ''}[/grey70])", 
+                          default=usage_obj.get('note') or '')
+    return new_usage, new_note
+
+# expected_usage 为确认提示中展示的用法，删除时核对它仍在该序号处
+def delete_and_report(store: KVSStore, cmd: str, index: int, expected_usage: str):
+    removed_data, command_deleted = store.delete_usage(cmd, index, expected_usage)
+    show_success(f"已删除 '{cmd}' 的用法: [cyan]{removed_data.get('usage','')}[/cyan] (备注: {removed_data.get('note') or ''})")
+    if command_deleted:
+        show_warning(f"主命令 '{cmd}' 已无用法，已自动移除主命令。")
+
+# 批量操作前展示匹配结果并确认；无匹配或用户取消时返回 False
+def confirm_bulk(results: list, query: str, action: str, assume_yes: bool) -> bool:
+    if not results:
+        show_warning(f"没有匹配 '{query}' 的用法，未做任何修改。")
+        return False
+    show_find_results(results, query)
+    cmd_count = len({r[0] for r in results})
+    if not assume_yes and not Confirm.ask(f"确认对以上 {cmd_count} 个主命令下的 {len(results)} 条用法执行{action}吗？", default=False):
+        show_warning(f"已取消{action}操作。")
+        return False
+    return True
+
+def run_fsck(store: KVSStore, repair: bool, output: str = None):
+    if not store.path.exists():
+        show_warning(f"数据库文件不存在：{store.path}")
+        return
+    report = check_db_file(store.path)
+    show_fsck_report(report)
+    if output:
+        export_data(report.db, output)
+        show_success(f"修复后的数据已写入 '{output}'。")
+    if report.clean:
+        show_success("数据库完好，无需修复。")
+    elif repair:
+        # 修复前保留原文件，避免误判时数据无法找回
+        backup = store.path.with_name(f"{store.path.name}.bak-{time.strftime('%Y%m%d-%H%M%S')}")
+        shutil.copy2(store.path, backup)
+        store.replace(report.db)
+        show_success(f"数据库已修复，保留 {len(report.db)} 个主命令。\n原文件已备份到 '{backup}'。")
+    elif not output:
+        show_warning("使用 'kvs fsck --repair' 修复数据库，或 '--output <文件>' 写出修复后的副本。")
+
 def main():
     parser = argparse.ArgumentParser(
         description="KVS: A local command dictionary with rich terminal output.",
@@ -34,6 +94,8 @@ def main():
     # --- list command ---
     list_parser = subparsers.add_parser('list', help='List commands or usages', add_help=False)
     list_parser.add_argument('cmd_name', nargs='?', help='Specific command to list examples for.')
+    list_parser.add_argument('--sort', choices=['default', 'frecency'], default='default',
+                             help='Sort order: insertion order (default) or by usage frecency.')
     
     # --- add command ---
     add_parser = subparsers.add_parser('add', help='Add a new command or usage', add_help=False)
@@ -66,6 +128,10 @@ def main():
                                help='Usage index (e.g., 0) or keyword (e.g., "checkout")')
     delete_parser.add_argument('--interactive', '-i', action='store_true', 
                                help='Enter interactive mode for deleting usage.')
+    delete_parser.add_argument('--match', metavar='QUERY',
+                               help='Delete every usage matched by a find-style query.')
+    delete_parser.add_argument('--yes', '-y', action='store_true',
+                               help='Skip the confirmation prompt for --match.')
     
     # --- edit command ---
     edit_parser = subparsers.add_parser('edit', help='Edit an existing command usage', add_help=False)
@@ -75,10 +141,29 @@ def main():
     edit_parser.add_argument('--new-note', help='New note string')
     edit_parser.add_argument('--interactive', '-i', action='store_true', 
                              help='Enter interactive mode for editing usage.')
+    edit_parser.add_argument('--match', metavar='QUERY',
+                             help='Rewrite the note (--new-note) of every usage matched by a find-style query.')
+    edit_parser.add_argument('--yes', '-y', action='store_true',
+                             help='Skip the confirmation prompt for --match.')
+
+    # --- retag command ---
+    retag_parser = subparsers.add_parser('retag', help='Add/remove tags on every command matched by a query', add_help=False)
+    retag_parser.add_argument('--match', metavar='QUERY', required=True,
+                              help='Find-style query selecting the commands to retag.')
+    retag_parser.add_argument('--add', type=str, help='Comma-separated tags to add')
+    retag_parser.add_argument('--remove', type=str, help='Comma-separated tags to remove')
+    retag_parser.add_argument('--yes', '-y', action='store_true',
+                              help='Skip the confirmation prompt.')
 
     # --- find command ---
     find_parser = subparsers.add_parser('find', help='Find commands by keyword', add_help=False)
     find_parser.add_argument('keywords', nargs='+', help='Keywords to search for')
+    find_parser.add_argument('--sort', choices=['default', 'frecency'], default='default',
+                             help='Sort order: by command name (default) or by usage frecency.')
+    find_parser.add_argument('--similar', action='store_true',
+                             help='Rank usages by TF-IDF similarity instead of substring matching.')
+    find_parser.add_argument('--top', type=int, default=10,
+                             help='Number of results to show with --similar (default: 10)')
 
     # --- copy command ---
     copy_parser = subparsers.add_parser('copy', help='Copy a command usage to clipboard', add_help=False)
@@ -86,6 +171,9 @@ def main():
     copy_parser.add_argument('index', type=int, nargs='?', default=0, 
                              help='Index of the usage to copy (default: 0)')
 
+    # --- pick command ---
+    subparsers.add_parser('pick', help='Interactively pick a usage to copy, edit or delete', add_help=False)
+
     # --- import command ---
     import_parser = subparsers.add_parser('import', help='Import commands from a JSON file', add_help=False)
     import_parser.add_argument('file_path', help='Path to the JSON file to import')
@@ -95,6 +183,24 @@ def main():
     # --- export command ---
     export_parser = subparsers.add_parser('export', help='Export commands to a JSON file', add_help=False)
     export_parser.add_argument('file_path', help='Path to the JSON file to export to')
+    export_parser.add_argument('--pretty', action='store_true',
+                               help='Write indented, human-readable JSON (default: compact)')
+
+    # --- fsck command ---
+    fsck_parser = subparsers.add_parser('fsck', help='Check database integrity and salvage a corrupt file', add_help=False)
+    fsck_parser.add_argument('--repair', action='store_true',
+                             help='Back up the original file and replace it with the repaired data')
+    fsck_parser.add_argument('--output', '-o', type=str,
+                             help='Write the repaired data to this file instead of touching the database')
+
+    # --- history commands ---
+    log_parser = subparsers.add_parser('log', help='Show the version history of the database', add_help=False)
+    log_parser.add_argument('-n', type=int, default=20, help='Number of versions to show (default: 20, 0 for all)')
+    subparsers.add_parser('undo', help='Undo the most recent change', add_help=False)
+    checkout_parser = subparsers.add_parser('checkout', help='Restore the database to a version from the history', add_help=False)
+    checkout_parser.add_argument('version', type=int, help='Version number shown by "kvs log"')
+    gc_parser = subparsers.add_parser('gc', help='Drop old versions and unreferenced history objects', add_help=False)
+    gc_parser.add_argument('--keep', type=int, default=50, help='Number of most recent versions to keep (default: 50)')
 
 
     args = parser.parse_args()
@@ -103,14 +209,59 @@ def main():
         show_help()
         return
 
-    db = load_db()
+    # 命中渲染缓存的 kvs list 无需加载数据库
+    if args.command == 'list' and args.sort == 'default' and show_cached_listing(args.cmd_name):
+        if args.cmd_name:
+            record_access([(args.cmd_name, None)])
+        return
+
+    # 所有修改都会记录到版本历史中，说明为本次执行的命令行
+    store = KVSStore(history=True)
+    store.history_message = " ".join(["kvs"] + sys.argv[1:])
 
     try:
+        if args.command == 'fsck': # 数据库损坏时也必须能运行，不能先加载
+            run_fsck(store, args.repair, args.output)
+            return
+
+        if args.command == 'log':
+            entries = store.log()
+            shown = entries[-args.n:] if args.n > 0 else entries
+            # 多取一条更早的记录，最早显示的版本也能算出变化量
+            counts = store.history.diff_counts(entries[-(len(shown) + 1):])
+            show_history_log(shown, counts, entries[-1]["version"] if entries else None)
+            return
+
+        if args.command == 'undo':
+            entry = store.undo()
+            show_success(f"已撤销最近一次修改，当前为版本 {entry['version']}（{entry['message']}）。")
+            return
+
+        if args.command == 'checkout':
+            entry = store.checkout(args.version)
+            show_success(f"已恢复到版本 {args.version}，当前为版本 {entry['version']}。可用 'kvs undo' 撤销本次恢复。")
+            return
+
+        if args.command == 'gc':
+            versions, objects, freed = store.gc_history(args.keep)
+            show_success(f"已清理 {versions} 个旧版本、{objects} 个历史对象，释放 {freed / 1024:.1f} KiB。")
+            return
+
+        db, db_stamp = store.snapshot_with_stamp()
+
         if args.command == 'list':
             if args.cmd_name:
-                show_cmd_examples(db, args.cmd_name)
+                order = None
+                if args.sort == 'frecency':
+                    order = sort_examples_by_frecency(db, args.cmd_name, load_scores())
+                show_cmd_examples(db, args.cmd_name, order, db_stamp)
+                if args.cmd_name in db:
+                    record_access([(args.cmd_name, None)])
             else:
-                show_main_cmds(db)
+                order = None
+                if args.sort == 'frecency':
+                    order = sort_commands_by_frecency(db, load_scores())
+                show_main_cmds(db, order, db_stamp)
 
         elif args.command == 'add':
             cmd, name, usage, note, tags_list = None, None, None, None, None
@@ -126,88 +277,83 @@ def main():
                 tags_str = Prompt.ask("标签 (逗号分隔, 例如: [green]dev,version[/green])", default="")
                 if tags_str: tags_list = [t.strip() for t in tags_str.split(',') if t.strip()]
             else:
-                cmd, name, usage, note = args.cmd, args.name, args.usage, args.note
+                cmd, name, usage, note = args.cmd, args.name, args.usage, args.note or ""
                 if args.tags:
                     tags_list = [t.strip() for t in args.tags.split(',') if t.strip()]
 
-            cmd_data, index = add_command(db, cmd, name, usage, note, tags_list)
-            save_db(db)
+            cmd_data, index = store.add(cmd, name, usage, note, tags_list)
             show_success(f"已成功添加 '{cmd}' 的新用法！")
             show_add_result(cmd, cmd_data, usage, note, index)
 
         elif args.command == 'update':
             if args.update_type == 'name':
-                if update_command_name(db, args.cmd, args.new_name):
-                    save_db(db)
-                    show_success(f"'{args.cmd}' 的中文名已更新为：[bold]{args.new_name}[/bold]")
-                else:
-                    show_error(f"未找到主命令：'{args.cmd}'")
+                store.update_name(args.cmd, args.new_name)
+                show_success(f"'{args.cmd}' 的中文名已更新为：[bold]{args.new_name}[/bold]")
             elif args.update_type == 'tag':
                 tags_list = [t.strip() for t in args.new_tags.split(',') if t.strip()]
-                if update_command_tags(db, args.cmd, tags_list):
-                    save_db(db)
-                    show_success(f"'{args.cmd}' 的标签已更新为：[bold]{', '.join(tags_list)}[/bold]")
-                else:
-                    show_error(f"未找到主命令：'{args.cmd}'")
+                store.update_tags(args.cmd, tags_list)
+                show_success(f"'{args.cmd}' 的标签已更新为：[bold]{', '.join(tags_list)}[/bold]")
 
         elif args.command == 'delete':
+            if args.match:
+                results = store.find(args.match)
+                if not confirm_bulk(results, args.match, "删除", args.yes):
+                    return
+                removed_count, removed_cmds = store.delete_usages(results)
+                show_success(f"已删除 {removed_count} 条匹配 '{args.match}' 的用法。")
+                if removed_cmds:
+                    show_warning(f"以下主命令已无用法，已自动移除：{', '.join(removed_cmds)}")
+                return
+
             cmd, identifier = args.cmd, args.identifier
             if args.interactive or not (cmd and identifier is not None):
                 console.print(Panel("[bold yellow]进入交互式删除模式[/bold yellow]", border_style="yellow"))
                 cmd = Prompt.ask("要删除用法的[green]主命令[/green]")
                 if cmd not in db:
-                    show_error(f"未找到主命令：'{cmd}'")
-                    return
-                show_cmd_examples(db, cmd) # Show current examples
+                    raise CommandNotFoundError(cmd)
+                show_cmd_examples(db, cmd, stamp=db_stamp) # Show current examples
                 identifier = Prompt.ask("要删除的用法[green]序号[/green] (或[green]关键词[/green]模糊删除, 'q' 退出)", default="q")
                 if identifier == 'q':
                     show_warning("已取消删除操作。")
                     return
-                try:
-                    identifier = int(identifier) # Try converting to int for index deletion
-                except ValueError:
-                    pass # Keep as string for keyword deletion
             
             if cmd not in db:
-                show_error(f"未找到主命令：'{cmd}'")
-                return
+                raise CommandNotFoundError(cmd)
 
-            # Confirm before deleting
-            usage_to_delete = None
-            if isinstance(identifier, int):
-                usage_obj = get_usage_by_index(db, cmd, identifier)
-                if usage_obj:
-                    usage_to_delete = usage_obj.get('usage', '未知用法')
-            elif isinstance(identifier, str):
-                # For keyword, we need to find it first to show confirmation
-                found_usages = [ex for ex in db[cmd].get('examples', []) 
-                                if identifier.lower() in ex.get('usage', '').lower() or identifier.lower() in ex.get('note', '').lower()]
-                if found_usages:
-                    usage_to_delete = found_usages[0].get('usage', '未知用法') # Just show the first match for confirmation
-            
-            if usage_to_delete and not Confirm.ask(f"确认删除 '{cmd}' 的用法: [cyan]{usage_to_delete}[/cyan] 吗？", default=False):
+            # 序号或关键词只解析一次，确认提示和实际删除使用同一条用法
+            if isinstance(identifier, str) and identifier.isdigit():
+                identifier = int(identifier)
+            index = resolve_usage_index(db, cmd, identifier)
+            if index is None:
+                raise UsageNotFoundError(cmd, identifier)
+
+            usage_to_delete = db[cmd]['examples'][index].get('usage') or ''
+            if not Confirm.ask(f"确认删除 '{cmd}' 的用法: [cyan]{usage_to_delete}[/cyan] 吗？", default=False):
                 show_warning("已取消删除操作。")
                 return
 
-            removed_data, command_deleted = delete_usage(db, cmd, identifier)
-            if removed_data:
-                save_db(db)
-                show_success(f"已删除 '{cmd}' 的用法: [cyan]{removed_data.get('usage','')}[/cyan] (备注: {removed_data.get('note','')})")
-                if command_deleted:
-                    show_warning(f"主命令 '{cmd}' 已无用法，已自动移除主命令。")
-            else:
-                show_error(f"删除失败。未找到主命令 '{cmd}' 或其用法 '{identifier}'。")
+            delete_and_report(store, cmd, index, usage_to_delete)
 
         elif args.command == 'edit':
+            if args.match:
+                if args.new_note is None:
+                    raise ValueError("批量编辑需要通过 --new-note 指定新的备注。")
+                results = store.find(args.match)
+                if not confirm_bulk(results, args.match, "改写备注", args.yes):
+                    return
+                updated = store.rewrite_notes(results, args.new_note)
+                show_success(f"已将 {updated} 条用法的备注改写为：[bold]{args.new_note}[/bold]")
+                return
+
             cmd, index, new_usage, new_note = args.cmd, args.index, args.new_usage, args.new_note
+            expected_usage = None # 交互模式下用户看到的原用法，保存时核对它未被其他进程改动
 
             if args.interactive or not (cmd and index is not None):
                 console.print(Panel("[bold yellow]进入交互式编辑模式[/bold yellow]", border_style="yellow"))
                 cmd = Prompt.ask("要编辑用法的[green]主命令[/green]")
                 if cmd not in db:
-                    show_error(f"未找到主命令：'{cmd}'")
-                    return
-                show_cmd_examples(db, cmd) # Show current examples
+                    raise CommandNotFoundError(cmd)
+                show_cmd_examples(db, cmd, stamp=db_stamp) # Show current examples
                 index = Prompt.ask("要编辑的用法[green]序号[/green]", default=None)
                 try:
                     index = int(index)
@@ -217,37 +363,44 @@ def main():
                 
                 current_usage_obj = get_usage_by_index(db, cmd, index)
                 if not current_usage_obj:
-                    show_error(f"未找到主命令 '{cmd}' 的序号为 {index} 的用法。")
-                    return
-                
-                new_usage = Prompt.ask(f"新用法示例 (当前: [cyan]{current_usage_obj.get('usage','')}[/cyan])", 
-                                       default=current_usage_obj.get('usage',''))
-                new_note = Prompt.ask(f"新备注说明 (当前: [grey70]{current_usage_obj.get('note','')}[/grey70])", 
-                                      default=current_usage_obj.get('note',''))
+                    raise UsageNotFoundError(cmd, index)
+                new_usage, new_note = prompt_new_usage(current_usage_obj)
+                expected_usage = current_usage_obj.get('usage') or ''
             
-            if cmd not in db:
-                show_error(f"未找到主命令：'{cmd}'")
+            store.edit_usage(cmd, index, new_usage, new_note, expected_usage)
+            show_success(f"已成功编辑 '{cmd}' 的第 {index} 条用法！")
+            db, db_stamp = store.snapshot_with_stamp()
+            show_cmd_examples(db, cmd, stamp=db_stamp) # Show updated examples
+
+        elif args.command == 'retag':
+            add_tags = [t.strip() for t in (args.add or '').split(',') if t.strip()]
+            remove_tags = [t.strip() for t in (args.remove or '').split(',') if t.strip()]
+            if not (add_tags or remove_tags):
+                raise ValueError("请通过 --add 或 --remove 指定要增加或移除的标签。")
+            results = store.find(args.match)
+            if not confirm_bulk(results, args.match, "修改标签", args.yes):
                 return
-            
-            if edit_usage(db, cmd, index, new_usage, new_note):
-                save_db(db)
-                show_success(f"已成功编辑 '{cmd}' 的第 {index} 条用法！")
-                show_cmd_examples(db, cmd) # Show updated examples
-            else:
-                show_error(f"编辑失败。未找到主命令 '{cmd}' 或序号 {index}。")
+            updated_cmds = store.retag_commands(results, add_tags, remove_tags)
+            show_success(f"已更新 {len(updated_cmds)} 个主命令的标签。")
 
         elif args.command == 'find':
             query = " ".join(args.keywords)
-            results = find_commands(db, query)
+            if args.similar:
+                try:
+                    from src.similar import find_similar # 依赖 numpy，按需导入
+                except ImportError:
+                    show_error("相似度检索需要 numpy，请先运行: pip install numpy")
+                    return
+                results = find_similar(db, query, args.top, db_stamp)
+            else:
+                results = find_commands(db, query)
+            if args.sort == 'frecency':
+                results = sort_results_by_frecency(results, load_scores())
             show_find_results(results, query)
+            record_access((cmd, usage) for cmd, _, _, usage, _ in results)
 
         elif args.command == 'copy':
-            cmd_data = db.get(args.cmd)
-            if not cmd_data:
-                show_error(f"未找到主命令：'{args.cmd}'")
-                return
-            
-            examples = cmd_data.get('examples', [])
+            examples = store.get_command(args.cmd).get('examples', [])
             if not examples:
                 show_error(f"主命令 '{args.cmd}' 暂无用法示例。")
                 return
@@ -256,36 +409,55 @@ def main():
                 show_error(f"用法序号 {args.index} 超出范围。'{args.cmd}' 共有 {len(examples)} 个用法 (0-{len(examples)-1})。")
                 return
             
-            usage_to_copy = examples[args.index]['usage']
-            try:
-                pyperclip.copy(usage_to_copy)
-                show_success(f"用法 '[cyan]{usage_to_copy}[/cyan]' 已复制到剪贴板！")
-            except pyperclip.PyperclipException as e:
-                show_error(f"复制到剪贴板失败: {e}\n请确保您的系统安装了剪贴板工具（例如 Linux 上的 xclip 或 xsel）。")
+            copy_usage(args.cmd, examples[args.index]['usage'])
+
+        elif args.command == 'pick':
+            if not (sys.stdin.isatty() and sys.stdout.isatty()):
+                show_error("kvs pick 需要在交互式终端中运行。")
+                return
+            picked = run_picker(db)
+            if not picked:
+                show_warning("已取消选择。")
+                return
+
+            cmd, index, action = picked
+            usage_obj = get_usage_by_index(db, cmd, index)
+            if action == 'copy':
+                copy_usage(cmd, usage_obj['usage'])
+            elif action == 'edit':
+                new_usage, new_note = prompt_new_usage(usage_obj)
+                store.edit_usage(cmd, index, new_usage, new_note, usage_obj.get('usage') or '')
+                show_success(f"已成功编辑 '{cmd}' 的第 {index} 条用法！")
+                db, db_stamp = store.snapshot_with_stamp()
+                show_cmd_examples(db, cmd, stamp=db_stamp)
+            elif action == 'delete':
+                usage_to_delete = usage_obj.get('usage') or ''
+                if not Confirm.ask(f"确认删除 '{cmd}' 的用法: [cyan]{usage_to_delete}[/cyan] 吗？", default=False):
+                    show_warning("已取消删除操作。")
+                    return
+                delete_and_report(store, cmd, index, usage_to_delete)
 
         elif args.command == 'import':
-            try:
-                updated_db, new_cmd_count, merged_count = import_data(db, args.file_path, args.overwrite)
-                save_db(updated_db)
-                show_success(f"数据已从 '{args.file_path}' 成功导入！\n新增主命令: {new_cmd_count}，合并/更新用法: {merged_count}。")
-                if not args.overwrite:
-                    show_warning("注意：导入时未覆盖现有命令，而是合并了用法。")
-            except FileNotFoundError as e:
-                show_error(f"导入失败: {e}")
-            except ValueError as e:
-                show_error(f"导入失败: {e}")
-            except Exception as e:
-                show_error(f"导入过程中发生错误: {e}")
+            # 文件无法读取或格式不对时抛出 ImportFormatError，由下面的 KVSError 分支展示
+            new_cmd_count, merged_count = store.import_file(args.file_path, args.overwrite)
+            show_success(f"数据已从 '{args.file_path}' 成功导入！\n新增主命令: {new_cmd_count}，合并/更新用法: {merged_count}。")
+            if not args.overwrite:
+                show_warning("注意：导入时未覆盖现有命令，而是合并了用法。")
 
         elif args.command == 'export':
-            try:
-                if export_data(db, args.file_path):
-                    show_success(f"数据已成功导出到 '{args.file_path}'！")
-            except Exception as e:
-                show_error(f"导出失败: {e}")
+            if store.export_file(args.file_path, args.pretty):
+                show_success(f"数据已成功导出到 '{args.file_path}'！")
 
     except KeyboardInterrupt:
         console.print("\n[yellow]操作已取消。[/yellow]")
+    except DatabaseCorruptError as e:
+        # 加载失败时绝不能把空数据库写回去，提示用户用 fsck 找回数据
+        show_error(f"{e}\n数据库未做任何修改。请运行 'kvs fsck' 检查，或 'kvs fsck --repair' 修复。")
+    except HistoryRecordError as e:
+        # 修改本身已经生效，只提示历史记录失败
+        show_warning(str(e))
+    except KVSError as e:
+        show_error(str(e))
     except ValueError as e:
         show_error(f"参数错误: {e}")
     except Exception as e:
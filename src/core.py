@@ -1,6 +1,9 @@
 # src/core.py
 from typing import List, Dict, Union
-import json # 确保这行存在
+
+from src.db import encode_json, decode_json, DECODE_ERRORS
+from src.errors import ImportFormatError, ExportError
+from src.fsck import check_command
 
 from rich.prompt import Prompt, Confirm # 用于交互式输入
 
@@ -44,28 +47,27 @@ def update_command_tags(db: dict, cmd: str, new_tags: List[str]) -> bool:
     db[cmd]['tags'] = sorted(list(set(new_tags))) # 覆盖并去重排序
     return True
 
+# 把序号或关键词解析为用法序号；关键词匹配第一条用法或备注包含它的用法
+# （旧版 kvs add 可能写入 "note": null，缺失或为 null 的字段按空字符串处理）
+def resolve_usage_index(db: dict, cmd: str, identifier: Union[int, str]) -> Union[int, None]:
+    exs = db.get(cmd, {}).get('examples', [])
+    if isinstance(identifier, int):
+        return identifier if 0 <= identifier < len(exs) else None
+    sub_l = identifier.lower()
+    for i, ex in enumerate(exs):
+        if sub_l in (ex.get('usage') or '').lower() or sub_l in (ex.get('note') or '').lower():
+            return i
+    return None
+
 def delete_usage(db: dict, cmd: str, identifier: Union[int, str]) -> Union[dict, None]:
     if cmd not in db or not db[cmd].get('examples'):
         return None # Command or examples not found
 
+    idx = resolve_usage_index(db, cmd, identifier)
+    if idx is None:
+        return None # Index out of bounds or keyword not found
     exs = db[cmd]['examples']
-    removed_usage = None
-
-    if isinstance(identifier, int):
-        idx = identifier
-        if idx < 0 or idx >= len(exs):
-            return None # Index out of bounds
-        removed_usage = exs.pop(idx)
-    else: # String (keyword)
-        sub_l = identifier.lower()
-        match_idx = -1
-        for i, ex in enumerate(exs):
-            if sub_l in ex.get('usage','').lower() or sub_l in ex.get('note','').lower():
-                match_idx = i
-                break
-        if match_idx == -1:
-            return None # Keyword not found
-        removed_usage = exs.pop(match_idx)
+    removed_usage = exs.pop(idx)
     
     # 如果用法删完了，自动删除主命令
     if not exs:
@@ -78,19 +80,20 @@ def find_commands(db: dict, query: str) -> List[tuple]:
     results = []
 
     for cmd, v in db.items():
-        name = v.get('name', "")
-        tags = v.get('tags', [])
+        name = v.get('name') or ""
+        tags = v.get('tags') or []
         
         # 检查主命令名、中文名或标签是否匹配
         if (query_l in cmd.lower()) or (query_l in name.lower()) or any(query_l in tag.lower() for tag in tags):
             # 整条命令都算命中，展示所有用法
             for idx, ex in enumerate(v.get("examples", [])):
-                results.append((cmd, name, idx, ex['usage'], ex['note']))
+                results.append((cmd, name, idx, ex.get('usage') or '', ex.get('note') or ''))
         else:
             # 检查用法示例或备注是否匹配
             for idx, ex in enumerate(v.get("examples", [])):
-                if (query_l in ex.get("usage", "").lower()) or (query_l in ex.get("note", "").lower()):
-                    results.append((cmd, name, idx, ex['usage'], ex['note']))
+                usage, note = ex.get('usage') or '', ex.get('note') or ''
+                if (query_l in usage.lower()) or (query_l in note.lower()):
+                    results.append((cmd, name, idx, usage, note))
     
     # 可以选择在这里对 results 进行排序，例如按命令名或匹配度
     results.sort(key=lambda x: (x[0].lower(), x[2])) # 按命令名和序号排序
@@ -120,51 +123,107 @@ def edit_usage(db: dict, cmd: str, index: int, new_usage: str = None, new_note:
     
     return True
 
+# 批量操作：matches 为 find_commands 的结果，一次遍历完成全部修改，由调用方统一保存
+def delete_usages(db: dict, matches: List[tuple]) -> tuple[int, List[str]]:
+    by_cmd: Dict[str, set] = {}
+    for cmd, _, idx, _, _ in matches:
+        by_cmd.setdefault(cmd, set()).add(idx)
+
+    removed_count = 0
+    removed_cmds = []
+    for cmd, idxs in by_cmd.items():
+        if cmd not in db:
+            continue
+        exs = db[cmd].get('examples', [])
+        kept = [ex for i, ex in enumerate(exs) if i not in idxs]
+        removed_count += len(exs) - len(kept)
+        # 与 delete_usage 一致：用法删完了自动删除主命令
+        if kept:
+            db[cmd]['examples'] = kept
+        else:
+            del db[cmd]
+            removed_cmds.append(cmd)
+    return removed_count, removed_cmds
+
+def retag_commands(db: dict, matches: List[tuple], add_tags: List[str] = None, remove_tags: List[str] = None) -> List[str]:
+    add_tags, remove_tags = add_tags or [], set(remove_tags or [])
+    updated = []
+    for cmd in dict.fromkeys(m[0] for m in matches): # 去重并保持顺序
+        if cmd not in db:
+            continue
+        old_tags = db[cmd].get('tags', [])
+        new_tags = sorted(t for t in set(old_tags + add_tags) if t not in remove_tags)
+        if new_tags != old_tags:
+            db[cmd]['tags'] = new_tags
+            updated.append(cmd)
+    return updated
+
+def rewrite_notes(db: dict, matches: List[tuple], new_note: str) -> int:
+    updated = 0
+    for cmd, _, idx, _, _ in matches:
+        exs = db.get(cmd, {}).get('examples', [])
+        if 0 <= idx < len(exs) and exs[idx].get('note') != new_note:
+            exs[idx]['note'] = new_note
+            updated += 1
+    return updated
+
 # 导入/导出逻辑
 def import_data(db: dict, file_path: str, overwrite: bool = False) -> Dict:
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            imported_data = json.load(f)
-        
-        if not isinstance(imported_data, dict):
-            raise ValueError("Imported file is not a valid KVS database format (expected dictionary).")
-            
-        merged_count = 0
-        new_cmd_count = 0
-
-        for cmd_key, cmd_value in imported_data.items():
-            if cmd_key in db:
-                if overwrite:
-                    db[cmd_key] = cmd_value
-                    merged_count += 1
-                else:
-                    # 合并用法：保留现有用法，添加导入中不重复的用法
-                    existing_examples = set(tuple(item.items()) for item in db[cmd_key].get('examples', []))
-                    for new_ex in cmd_value.get('examples', []):
-                        if tuple(new_ex.items()) not in existing_examples:
-                            db[cmd_key].get('examples', []).append(new_ex)
-                            merged_count += 1
-                    # 更新名称和标签（可以根据需求调整合并策略）
-                    if cmd_value.get('name'):
-                        db[cmd_key]['name'] = cmd_value['name']
-                    if cmd_value.get('tags'):
-                        db[cmd_key]['tags'] = sorted(list(set(db[cmd_key].get('tags', []) + cmd_value['tags'])))
-            else:
+        with open(file_path, 'rb') as f:
+            imported_data = decode_json(f.read())
+    except FileNotFoundError as e:
+        raise ImportFormatError(file_path, "文件不存在") from e
+    except OSError as e:
+        raise ImportFormatError(file_path, f"读取失败: {e}") from e
+    except DECODE_ERRORS as e:
+        raise ImportFormatError(file_path, "不是合法的 JSON") from e
+
+    if not isinstance(imported_data, dict):
+        raise ImportFormatError(file_path, "不是 KVS 数据库格式（顶层应为对象）")
+
+    # 写入前按 fsck 的 schema 逐个校验：能修复的（如 tags 含非字符串项）修复后导入，
+    # 无法修复的（如值不是对象、没有有效用法）拒绝整个文件，避免坏数据进入数据库后每次修改都失败
+    checked, bad = {}, []
+    for cmd_key, cmd_value in imported_data.items():
+        fixed, problems = check_command(cmd_key, cmd_value)
+        if fixed is None:
+            bad.append(f"'{cmd_key}'（{'；'.join(problems)}）")
+        else:
+            checked[cmd_key] = fixed
+    if bad:
+        more = f" 等 {len(bad)} 项" if len(bad) > 3 else ""
+        raise ImportFormatError(file_path, f"以下主命令不符合数据库格式，未导入任何数据: {'，'.join(bad[:3])}{more}")
+
+    merged_count = 0
+    new_cmd_count = 0
+
+    for cmd_key, cmd_value in checked.items():
+        if cmd_key in db:
+            if overwrite:
                 db[cmd_key] = cmd_value
-                new_cmd_count += 1
-        return db, new_cmd_count, merged_count
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Import file not found: {file_path}")
-    except json.JSONDecodeError:
-        raise ValueError(f"Invalid JSON format in file: {file_path}")
-    except Exception as e:
-        raise Exception(f"An error occurred during import: {e}")
-
-def export_data(db: dict, file_path: str) -> bool:
+                merged_count += 1
+            else:
+                # 合并用法：保留现有用法，添加导入中不重复的用法
+                existing_examples = set(tuple(item.items()) for item in db[cmd_key].get('examples', []))
+                for new_ex in cmd_value.get('examples', []):
+                    if tuple(new_ex.items()) not in existing_examples:
+                        db[cmd_key].get('examples', []).append(new_ex)
+                        merged_count += 1
+                # 更新名称和标签（可以根据需求调整合并策略）
+                if cmd_value.get('name'):
+                    db[cmd_key]['name'] = cmd_value['name']
+                if cmd_value.get('tags'):
+                    db[cmd_key]['tags'] = sorted(list(set(db[cmd_key].get('tags', []) + cmd_value['tags'])))
+        else:
+            db[cmd_key] = cmd_value
+            new_cmd_count += 1
+    return db, new_cmd_count, merged_count
+
+def export_data(db: dict, file_path: str, pretty: bool = False) -> bool:
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(db, f, ensure_ascii=False, indent=2)
+        with open(file_path, 'wb') as f:
+            f.write(encode_json(db, pretty=pretty))
         return True
-    except Exception as e:
-        raise Exception(f"An error occurred during export: {e}")
-
+    except OSError as e:
+        raise ExportError(file_path, e) from e
@@ -1,7 +1,77 @@
 # src/db.py
 import json
 import os
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.errors import DatabaseCorruptError, DatabaseIOError
+
+# JSON 编解码层：优先使用 orjson，其次 msgspec，都未安装时退回标准库 json。
+# 磁盘上默认使用紧凑格式（无缩进），仅 export --pretty 时输出带缩进的 JSON。
+# 可通过环境变量 KVS_JSON_CODEC=orjson|msgspec|json 强制指定编解码器。
+try:
+    import orjson # pip install orjson（可选）
+except ImportError:
+    orjson = None
+try:
+    import msgspec # pip install msgspec（可选）
+except ImportError:
+    msgspec = None
+
+AVAILABLE_CODECS = [name for name, mod in (("orjson", orjson), ("msgspec", msgspec)) if mod] + ["json"]
+
+DECODE_ERRORS = (ValueError,) + ((msgspec.DecodeError,) if msgspec else ()) # json/orjson 的解码错误均为 ValueError 子类
+
+def get_codec() -> str:
+    codec = os.getenv("KVS_JSON_CODEC")
+    return codec if codec in AVAILABLE_CODECS else AVAILABLE_CODECS[0]
+
+def encode_json(obj, pretty: bool = False, codec: str = None) -> bytes:
+    codec = codec or get_codec()
+    if codec == "orjson":
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if codec == "msgspec":
+        data = msgspec.json.encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def decode_json(data: bytes, codec: str = None):
+    codec = codec or get_codec()
+    if codec == "orjson":
+        return orjson.loads(data)
+    if codec == "msgspec":
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+# 类型化的数据结构；安装了 msgspec 时直接解码为 Struct，否则由字典构造 dataclass。
+# 旧版 kvs add 省略备注时会写入 "note": null，两种实现都将其规整为空字符串。
+if msgspec:
+    class Example(msgspec.Struct):
+        usage: str
+        note: Optional[str] = ""
+
+        def __post_init__(self):
+            if self.note is None:
+                self.note = ""
+
+    class Command(msgspec.Struct):
+        name: str = ""
+        tags: List[str] = []
+        examples: List[Example] = []
+else:
+    @dataclass
+    class Example:
+        usage: str
+        note: str = ""
+
+    @dataclass
+    class Command:
+        name: str = ""
+        tags: List[str] = field(default_factory=list)
+        examples: List[Example] = field(default_factory=list)
 
 # 使用XDG Base Directory Specification
 # 优先使用 XDG_DATA_HOME，否则默认为 ~/.local/share/kvs/
@@ -12,27 +82,74 @@ def get_db_path() -> Path:
     else:
         return Path.home() / ".local" / "share" / "kvs" / "commands.json"
 
-def load_db() -> dict:
-    db_path = get_db_path()
+# kvs list 渲染结果的磁盘缓存目录，任何 save_db 都会清空它
+def get_render_cache_dir(db_path: Path = None) -> Path:
+    return (db_path or get_db_path()).parent / "render_cache"
+
+# 版本历史目录（kvs log / undo / checkout），结构见 src/history.py
+def get_history_dir(db_path: Path = None) -> Path:
+    return (db_path or get_db_path()).parent / "history"
+
+def clear_render_cache(db_path: Path = None):
+    cache_dir = get_render_cache_dir(db_path)
+    if not cache_dir.exists():
+        return
+    for cache_file in cache_dir.iterdir():
+        try:
+            cache_file.unlink()
+        except OSError:
+            pass
+
+def _read_db_bytes(db_path: Path) -> bytes:
+    try:
+        return db_path.read_bytes()
+    except OSError as e:
+        raise DatabaseIOError(f"An error occurred while loading DB: {e}") from e
+
+def load_db(db_path: Path = None) -> dict:
+    db_path = db_path or get_db_path()
     if not db_path.exists():
         return {}
     try:
-        with open(db_path, encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        # 可以记录错误日志
-        print(f"Error: Could not decode JSON from {db_path}. Database might be corrupt.")
-        return {}
-    except Exception as e:
-        print(f"An unexpected error occurred while loading DB: {e}")
-        return {}
+        db_data = decode_json(_read_db_bytes(db_path))
+    except DECODE_ERRORS as e:
+        raise DatabaseCorruptError(f"Could not decode JSON from {db_path}. Database might be corrupt. ({e})") from e
+    if not isinstance(db_data, dict):
+        raise DatabaseCorruptError(f"{db_path} is not a valid KVS database (expected a JSON object).")
+    return db_data
 
-def save_db(db_data: dict):
-    db_path = get_db_path()
-    db_path.parent.mkdir(parents=True, exist_ok=True)
+# 与 load_db 相同，但解码为 {主命令: Command}。
+# 未指定 codec 且安装了 msgspec 时直接按类型解码，否则先用指定的编解码器解码再构造
+def load_db_typed(db_path: Path = None, codec: str = None) -> Dict[str, Command]:
+    db_path = db_path or get_db_path()
+    if not db_path.exists():
+        return {}
+    data = _read_db_bytes(db_path)
     try:
-        with open(db_path, "w", encoding="utf-8") as f:
-            json.dump(db_data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"An error occurred while saving DB: {e}")
+        if msgspec and codec in (None, "msgspec"):
+            return msgspec.json.decode(data, type=Dict[str, Command])
+        return {
+            cmd: Command(
+                name=v.get("name", ""),
+                tags=list(v.get("tags", [])),
+                examples=[Example(ex["usage"], ex.get("note") or "") for ex in v.get("examples", [])],
+            )
+            for cmd, v in decode_json(data, codec).items()
+        }
+    except DECODE_ERRORS + (AttributeError, KeyError, TypeError) as e:
+        raise DatabaseCorruptError(f"Could not decode {db_path} into typed commands: {e}") from e
 
+# 先写临时文件并 fsync，再原子替换，避免写到一半时崩溃留下残缺的数据库
+def save_db(db_data: dict, db_path: Path = None):
+    db_path = db_path or get_db_path()
+    tmp_path = db_path.with_name(db_path.name + ".tmp")
+    try:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(encode_json(db_data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, db_path)
+    except OSError as e:
+        raise DatabaseIOError(f"An error occurred while saving DB: {e}") from e
+    clear_render_cache(db_path)
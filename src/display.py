@@ -1,13 +1,66 @@
 # src/display.py
+import hashlib
+import time
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich.text import Text
 from rich import box
 
+from src.db import get_db_path, get_render_cache_dir
+
 console = Console()
 
-def show_main_cmds(db: dict):
+# kvs list / kvs list <命令> 的渲染结果（含 ANSI 转义）缓存在磁盘上。
+# 键由数据库版本（文件 mtime 与大小）、影响输出的终端选项（宽度、颜色模式、NO_COLOR、编码等）和列表对象组成，
+# save_db 会清空整个缓存目录，因此命中时可以直接输出，无需加载数据库或重新计算列宽。
+# 写入缓存时的数据库版本必须是渲染所用快照加载时的 (mtime_ns, size)，而不是渲染完成后再读文件状态，
+# 否则期间有其他进程保存时，旧内容会被缓存在新版本的键下。
+def _listing_cache_path(stamp, cmd: str = None):
+    key = "\0".join([
+        str(stamp[0]), str(stamp[1]), str(console.width), str(console.color_system),
+        str(console.no_color), str(console.encoding), str(console.legacy_windows),
+        str(console.is_terminal), cmd if cmd is not None else "\0main",
+    ])
+    return get_render_cache_dir() / (hashlib.sha1(key.encode("utf-8")).hexdigest() + ".ansi")
+
+# 命中缓存时直接输出并返回 True
+def show_cached_listing(cmd: str = None) -> bool:
+    try:
+        st = get_db_path().stat()
+        with open(_listing_cache_path((st.st_mtime_ns, st.st_size), cmd), "rb") as f:
+            data = f.read()
+    except OSError:
+        return False
+    console.file.flush()
+    buffer = getattr(console.file, "buffer", None)
+    if buffer is not None:
+        buffer.write(data)
+        buffer.flush()
+    else:
+        console.file.write(data.decode("utf-8"))
+    return True
+
+# stamp 为 db 加载时 commands.json 的 (mtime_ns, size)；为 None 时只输出不缓存
+def _print_and_cache(renderable, stamp, cmd: str = None):
+    with console.capture() as capture:
+        console.print()
+        console.print(renderable)
+        console.print()
+    output = capture.get()
+    console.file.write(output)
+    if stamp is None:
+        return
+    cache_path = _listing_cache_path(stamp, cmd)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+        tmp_path.write_bytes(output.encode("utf-8"))
+        tmp_path.replace(cache_path)
+    except OSError:
+        pass # 缓存写失败不影响正常输出
+
+def show_main_cmds(db: dict, order: list = None, stamp=None):
     if not db:
         console.print()
         console.print(Panel("[grey70]暂无收录任何主命令，可以用 'kvs add' 新增。[/grey70]", border_style="yellow"))
@@ -29,17 +82,22 @@ def show_main_cmds(db: dict):
     table.add_column("用法数量", style="grey70", justify="right")
     table.add_column("标签", style="blue") # 新增标签列
 
-    for cmd, v in db.items():
+    # order 为主命令的显示顺序（例如按频度排序），默认按收录顺序
+    for cmd in (order if order is not None else db):
+        v = db[cmd]
         name = v.get('name', "")
         usage_len = len(v.get("examples", []))
         tags = ", ".join(v.get("tags", [])) # 获取并格式化标签
         table.add_row(cmd, name or "-", str(usage_len), tags or "-")
 
+    if order is None:
+        _print_and_cache(table, stamp)
+        return
     console.print()
     console.print(table)
     console.print()
 
-def show_cmd_examples(db: dict, cmd: str):
+def show_cmd_examples(db: dict, cmd: str, order: list = None, stamp=None):
     if cmd not in db:
         console.print()
         console.print(Panel(f"[red]未找到主命令：'{cmd}'[/red]\n请检查拼写，或用 'kvs add' 添加新命令。", border_style="red"))
@@ -69,9 +127,14 @@ def show_cmd_examples(db: dict, cmd: str):
     table.add_column("用法示例", style="white", no_wrap=False)
     table.add_column("备注说明", style="grey70", no_wrap=False)
 
-    for idx, ex in enumerate(exs):
-        table.add_row(str(idx), ex.get("usage",""), ex.get("note",""))
+    # order 为用法序号的显示顺序，序号本身保持不变，便于 copy/edit/delete 引用
+    for idx in (order if order is not None else range(len(exs))):
+        ex = exs[idx]
+        table.add_row(str(idx), ex.get("usage") or "", ex.get("note") or "")
 
+    if order is None:
+        _print_and_cache(table, stamp, cmd)
+        return
     console.print()
     console.print(table)
     console.print()
@@ -124,10 +187,67 @@ def show_find_results(results: list, query: str):
     for row in results:
         cmd, name, idx, usage, note = row
         # 简单高亮，如果需要更复杂的正则高亮，可以结合re模块
-        highlighted_usage = usage.replace(query, f"[bold yellow]{query}[/bold yellow]")
-        highlighted_note = note.replace(query, f"[bold yellow]{query}[/bold yellow]")
-        table.add_row(cmd, name, str(idx), highlighted_usage, highlighted_note)
+        highlighted_usage = (usage or "").replace(query, f"[bold yellow]{query}[/bold yellow]")
+        highlighted_note = (note or "").replace(query, f"[bold yellow]{query}[/bold yellow]")
+        table.add_row(cmd, name or "", str(idx), highlighted_usage, highlighted_note)
+
+    console.print()
+    console.print(table)
+    console.print()
 
+def show_fsck_report(report, limit: int = 50):
+    rows = [("损坏区域", f"偏移 {offset}", message) for offset, message in report.corrupt_regions]
+    rows += [("已丢弃", cmd, reason) for cmd, reason in report.dropped]
+    rows += [("已修复", cmd, "；".join(problems)) for cmd, problems in report.repaired]
+    if rows:
+        table = Table(
+            show_header=True,
+            header_style="bold cyan",
+            row_styles=["none","#191919"],
+            box=box.SIMPLE,
+            title="[bold]数据库检查结果[/bold]",
+            expand=True,
+            padding=(0,2),
+        )
+        table.add_column("类型", style="bold yellow", no_wrap=True)
+        table.add_column("位置/主命令", style="bold green")
+        table.add_column("说明", style="grey70")
+        for row in rows[:limit]:
+            table.add_row(*row)
+        if len(rows) > limit:
+            table.add_row("...", f"其余 {len(rows) - limit} 项未显示", "")
+        console.print()
+        console.print(table)
+    summary = (
+        f"扫描主命令: {report.total}，可恢复: {len(report.db)}，"
+        f"已修复: {len(report.repaired)}，已丢弃: {len(report.dropped)}，损坏区域: {len(report.corrupt_regions)}"
+    )
+    console.print(Panel(summary, border_style="green" if report.clean else "yellow"))
+
+def show_history_log(entries: list, counts: dict, head_version: int):
+    if not entries:
+        console.print(Panel("[yellow]还没有任何版本记录。[/yellow]", border_style="yellow"))
+        return
+    table = Table(
+        show_header=True,
+        header_style="bold cyan",
+        row_styles=["none","#191919"],
+        box=box.SIMPLE,
+        title="[bold]版本历史[/bold]",
+        expand=True,
+        padding=(0,2),
+    )
+    table.add_column("版本", style="bold green", no_wrap=True)
+    table.add_column("时间", style="grey70", no_wrap=True)
+    table.add_column("变化", style="yellow", no_wrap=True)
+    table.add_column("说明", style="white")
+    for entry in reversed(entries): # 最新的版本在最上面
+        version = entry["version"]
+        label = f"* {version}" if version == head_version else f"  {version}"
+        added, changed, removed = counts.get(version, (0, 0, 0))
+        change = f"+{added} ~{changed} -{removed}" if version in counts else "-"
+        ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["ts"]))
+        table.add_row(label, ts, change, entry.get("message", ""))
     console.print()
     console.print(table)
     console.print()
@@ -143,9 +263,14 @@ def show_help():
     console.print("[bold green]  kvs update-tag ...[/bold green][white]  修改主命令的标签[/white]")
     console.print("[bold green]  kvs delete ...[/bold green][white]      删除某命令下指定用法（根据序号或关键词）[/white]")
     console.print("[bold green]  kvs edit ...[/bold green][white]        编辑某命令下指定用法[/white]")
+    console.print("[bold green]  kvs retag ...[/bold green][white]       按查询批量增删标签[/white]")
     console.print("[bold green]  kvs find ...[/bold green][white]        关键词模糊查找命令与用法（支持中英文）[/white]")
     console.print("[bold green]  kvs copy ...[/bold green][white]        复制用法到剪贴板[/white]")
+    console.print("[bold green]  kvs pick[/bold green][white]            全屏边输入边过滤，选中后复制/编辑/删除[/white]")
     console.print("[bold green]  kvs import/export ...[/bold green][white] 导入/导出命令数据[/white]")
+    console.print("[bold green]  kvs fsck[/bold green][white]            检查数据库完整性，--repair 修复损坏的数据库[/white]")
+    console.print("[bold green]  kvs log/undo[/bold green][white]        查看修改历史 / 撤销最近一次修改[/white]")
+    console.print("[bold green]  kvs checkout ...[/bold green][white]    恢复到历史中的某个版本（gc 清理旧版本）[/white]")
     console.print("")
     console.print("[bold yellow]示例：[/bold yellow]")
     eg = Text()
@@ -153,15 +278,26 @@ def show_help():
     eg.append("  kvs add git --interactive\n", "cyan") # 交互式示例
     eg.append("  kvs list\n", "cyan")
     eg.append("  kvs list git\n", "cyan")
+    eg.append("  kvs list --sort frecency\n", "cyan") # 按使用频度排序
     eg.append("  kvs update ls \"文件列表\"\n", "cyan")
     eg.append("  kvs update-tag git dev,version\n", "cyan")
     eg.append("  kvs delete git 0\n", "cyan")
     eg.append("  kvs delete git --interactive\n", "cyan") # 交互式删除示例
     eg.append("  kvs edit git 1 --new-usage \"git branch -a\"\n", "cyan")
+    eg.append("  kvs delete --match 废弃\n", "cyan") # 按查询批量删除
+    eg.append("  kvs retag --match docker --add container\n", "cyan")
     eg.append("  kvs find 分支\n", "cyan")
+    eg.append("  kvs find --similar \"查看端口占用\"\n", "cyan") # 相似度检索
     eg.append("  kvs copy git 0\n", "cyan")
-    eg.append("  kvs export ~/kvs_backup.json\n", "cyan")
+    eg.append("  kvs pick\n", "cyan")
+    eg.append("  kvs export ~/kvs_backup.json --pretty\n", "cyan")
+    eg.append("  kvs fsck --repair\n", "cyan") # 从损坏的数据库中找回命令
+    eg.append("  kvs log -n 5\n", "cyan")
+    eg.append("  kvs undo\n", "cyan")
+    eg.append("  kvs checkout 3\n", "cyan")
+    eg.append("  kvs gc --keep 20\n", "cyan")
     console.print(eg)
+    console.print("[bold magenta]Tip：[/bold magenta][grey50]list/find 支持 --sort frecency，常用的用法排在前面。[/grey50]")
     console.print("[bold magenta]Tip：[/bold magenta][grey50]命令词典保存在符合XDG规范的目录下，请注意备份。[/grey50]")
     console.print("\n[grey70]支持中文、模糊查找；适合个人高效管理常用命令。[/grey70]\n")
 
@@ -0,0 +1,57 @@
+# src/errors.py
+# KVS 的结构化异常，供 db / store 抛出，由调用方（CLI 或嵌入方）决定如何展示
+
+class KVSError(Exception):
+    pass
+
+class DatabaseError(KVSError):
+    pass
+
+class DatabaseCorruptError(DatabaseError):
+    pass
+
+class DatabaseIOError(DatabaseError):
+    pass
+
+class CommandNotFoundError(KVSError):
+    def __init__(self, cmd: str):
+        super().__init__(f"未找到主命令：'{cmd}'")
+        self.cmd = cmd
+
+class UsageNotFoundError(KVSError):
+    def __init__(self, cmd: str, identifier):
+        super().__init__(f"未找到主命令 '{cmd}' 的用法 '{identifier}'。")
+        self.cmd = cmd
+        self.identifier = identifier
+
+class MatchesChangedError(KVSError):
+    # 用户确认过的用法（批量匹配结果或单条用法）在保存前已被其他进程改动
+    def __init__(self):
+        super().__init__("确认之后数据库已被修改，所确认的用法已变化，未做任何修改，请重新执行。")
+
+class ImportFormatError(KVSError):
+    # 导入文件无法读取、不是合法 JSON，或不符合 KVS 数据库格式
+    def __init__(self, file_path, reason: str):
+        super().__init__(f"无法导入 '{file_path}'：{reason}")
+        self.file_path = file_path
+        self.reason = reason
+
+class ExportError(KVSError):
+    def __init__(self, file_path, cause: Exception):
+        super().__init__(f"无法导出到 '{file_path}'：{cause}")
+        self.file_path = file_path
+        self.cause = cause
+
+class HistoryError(KVSError):
+    pass
+
+class HistoryRecordError(HistoryError):
+    # 数据库修改已经保存成功，只是没能记录到版本历史中
+    def __init__(self, cause: Exception):
+        super().__init__(f"修改已保存，但记录版本历史失败: {cause}")
+        self.cause = cause
+
+class VersionNotFoundError(HistoryError):
+    def __init__(self, version: int):
+        super().__init__(f"未找到版本 {version}（可能已被 kvs gc 清理）。")
+        self.version = version
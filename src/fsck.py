@@ -0,0 +1,159 @@
+# src/fsck.py
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Tuple
+
+# kvs fsck：检查并修复 commands.json。
+#
+# 1. 扫描：从头到尾单遍解析顶层对象，逐个解码 "主命令": {...}。
+#    遇到无法解码的位置时记录损坏区域，然后向后查找下一个形如 "key": { 的位置继续解析，
+#    因此部分损坏的文件中所有仍可解码的主命令都能被找回。
+# 2. 校验：按 schema（name 字符串、tags 字符串列表、examples 为含 usage/note 的对象列表）
+#    检查每个主命令并尽量修复。校验远比解码便宜，直接在扫描结果上顺序进行。
+
+_RESYNC_RE = re.compile(r'"(?:[^"\\]|\\.)*"\s*:\s*\{')
+_WS_RE = re.compile(r"\s*")
+
+@dataclass
+class FsckReport:
+    total: int = 0                                                 # 扫描到的主命令数量
+    repaired: List[Tuple[str, List[str]]] = field(default_factory=list)  # (主命令, 修复说明)
+    dropped: List[Tuple[str, str]] = field(default_factory=list)         # (主命令, 丢弃原因)
+    corrupt_regions: List[Tuple[int, str]] = field(default_factory=list) # (字符偏移, 错误说明)
+    db: dict = field(default_factory=dict)                         # 修复后的数据
+
+    @property
+    def clean(self) -> bool:
+        return not (self.repaired or self.dropped or self.corrupt_regions)
+
+def _skip_ws(text: str, pos: int) -> int:
+    return _WS_RE.match(text, pos).end()
+
+# 返回 ([(主命令, 值)], [(偏移, 错误说明)])
+def scan_entries(text: str) -> Tuple[List[Tuple[str, object]], List[Tuple[int, str]]]:
+    decoder = json.JSONDecoder()
+    entries, errors = [], []
+
+    def parse_entry(pos: int):
+        # 解析 "key": value，返回 (key, value, 结束位置)
+        if text[pos:pos + 1] != '"':
+            raise ValueError("expected a command name")
+        key, pos = decoder.raw_decode(text, pos)
+        pos = _skip_ws(text, pos)
+        if text[pos:pos + 1] != ":":
+            raise ValueError("expected ':'")
+        value, pos = decoder.raw_decode(text, _skip_ws(text, pos + 1))
+        return key, value, _skip_ws(text, pos)
+
+    def resync(pos: int) -> int:
+        # 从 pos 之后找到下一条能完整解码为对象的 "key": {...}，返回其起点；找不到时返回 -1
+        for m in _RESYNC_RE.finditer(text, pos):
+            try:
+                _, value, _ = parse_entry(m.start())
+            except ValueError:
+                continue
+            if isinstance(value, dict) and "examples" in value:
+                return m.start()
+        return -1
+
+    pos = _skip_ws(text, 0)
+    if text[pos:pos + 1] == "{":
+        pos = _skip_ws(text, pos + 1)
+        if text[pos:pos + 1] == "}":
+            return entries, errors
+    else:
+        errors.append((pos, "文件不是以 '{' 开头的 JSON 对象"))
+        pos = resync(pos)
+
+    while 0 <= pos < len(text):
+        try:
+            key, value, pos = parse_entry(pos)
+            entries.append((key, value))
+            if text[pos:pos + 1] == ",":
+                pos = _skip_ws(text, pos + 1)
+                continue
+            if text[pos:pos + 1] == "}":
+                if _skip_ws(text, pos + 1) != len(text):
+                    errors.append((pos + 1, "对象结束后仍有多余内容"))
+                break
+            raise ValueError("expected ',' or '}'")
+        except ValueError as e:
+            message = e.msg if isinstance(e, json.JSONDecodeError) else str(e)
+            errors.append((pos, message))
+            pos = resync(pos + 1)
+    else:
+        if pos >= len(text):
+            errors.append((len(text), "文件意外结束（可能被截断）"))
+    return entries, errors
+
+def check_command(cmd, v) -> Tuple[object, List[str]]:
+    # 返回 (修复后的主命令或 None, 问题说明列表)
+    if not isinstance(cmd, str) or not cmd.strip():
+        return None, ["主命令名为空"]
+    if not isinstance(v, dict):
+        return None, ["不是对象"]
+
+    problems = []
+    name = v.get("name", "")
+    if not isinstance(name, str):
+        problems.append("name 不是字符串，已清空")
+        name = ""
+
+    tags = v.get("tags", [])
+    if not isinstance(tags, list):
+        problems.append("tags 不是列表，已清空")
+        tags = []
+    elif not all(isinstance(t, str) for t in tags):
+        problems.append("tags 含非字符串项，已移除")
+        tags = [t for t in tags if isinstance(t, str)]
+
+    examples = v.get("examples", [])
+    if not isinstance(examples, list):
+        problems.append("examples 不是列表")
+        examples = []
+    fixed_examples = []
+    for i, ex in enumerate(examples):
+        if not isinstance(ex, dict) or not isinstance(ex.get("usage"), str) or not ex["usage"]:
+            problems.append(f"第 {i} 条用法缺少 usage，已移除")
+            continue
+        note = ex.get("note")
+        if note is None: # 旧版 kvs add 省略备注时会写入 null，按空备注处理，不算损坏
+            note = ""
+        elif not isinstance(note, str):
+            problems.append(f"第 {i} 条用法的 note 不是字符串，已清空")
+            note = ""
+        fixed_examples.append({**ex, "usage": ex["usage"], "note": note})
+
+    if not fixed_examples:
+        return None, problems + ["没有有效用法"]
+    return {**v, "name": name, "tags": tags, "examples": fixed_examples}, problems
+
+def check_text(text: str) -> FsckReport:
+    entries, errors = scan_entries(text)
+    report = FsckReport(total=len(entries), corrupt_regions=errors)
+    seen = set()
+    for cmd, value in entries:
+        if cmd in seen:
+            report.repaired.append((cmd, ["主命令重复出现，保留最后一次"]))
+        seen.add(cmd)
+        fixed, problems = check_command(cmd, value)
+        if fixed is None:
+            report.dropped.append((str(cmd), "；".join(problems)))
+            report.db.pop(cmd, None)
+            continue
+        if problems:
+            report.repaired.append((cmd, problems))
+        report.db[cmd] = fixed
+    return report
+
+def check_db_file(db_path: Path) -> FsckReport:
+    data = db_path.read_bytes()
+    try:
+        return check_text(data.decode("utf-8"))
+    except UnicodeDecodeError as e:
+        # 无法解码的字节替换为占位符后继续，避免一处编码损坏导致整个文件不可读
+        report = check_text(data.decode("utf-8", errors="replace"))
+        report.corrupt_regions.append((e.start, f"第 {e.start} 字节起包含无法按 UTF-8 解码的字节"))
+        return report
@@ -0,0 +1,239 @@
+# src/history.py
+import hashlib
+import json
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from src.db import encode_json, decode_json, get_history_dir, DECODE_ERRORS
+from src.errors import HistoryError, VersionNotFoundError
+
+# 数据库的版本历史，供 kvs log / undo / checkout / gc 使用。
+#
+# 所有对象按内容寻址（sha256）并以 zlib 压缩保存在 history/objects/ab/cdef... 中：
+# - 命令对象：单个主命令的数据；
+# - 分块对象：[[主命令, 命令对象哈希], ...]，按内容定义的边界切分（命令哈希低位为 0 处断开），
+#   修改一个命令只会让它所在的一个分块变化；
+# - 根对象：{"chunks": [分块哈希, ...]}，代表一个完整版本。
+# 未修改的命令和分块在版本之间按哈希共享，因此每个版本的开销约等于改动本身的大小。
+#
+# history/log.jsonl 逐行追加版本记录 {version, root, parent, ts, message}，parent 是“撤销后应回到的版本”。
+# history/stamp 记录最新版本对应的 commands.json 的 (mtime_ns, size)，
+# 用来判断数据库文件是否在历史之外被改动过。
+
+CHUNK_MASK = 0x3F # 平均每 64 个命令一个分块
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+class History:
+    def __init__(self, db_path: Path):
+        self.root_dir = get_history_dir(db_path)
+        self.objects_dir = self.root_dir / "objects"
+        self.log_path = self.root_dir / "log.jsonl"
+        self.stamp_path = self.root_dir / "stamp"
+        self._tree_cache = None # (根哈希, [(主命令, 命令哈希)])
+
+    # --- 对象存储 ---
+
+    def _object_path(self, h: str) -> Path:
+        return self.objects_dir / h[:2] / h[2:]
+
+    def _put(self, obj) -> str:
+        data = encode_json(obj)
+        h = _hash(data)
+        path = self._object_path(h)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(data, 1))
+            os.replace(tmp_path, path)
+        return h
+
+    def _get(self, h: str):
+        try:
+            return decode_json(zlib.decompress(self._object_path(h).read_bytes()))
+        except (OSError, zlib.error) + DECODE_ERRORS as e:
+            raise HistoryError(f"历史对象 {h[:12]} 缺失或已损坏: {e}") from e
+
+    # --- 版本树 ---
+
+    # 写入 db 对应的版本树，返回 (根哈希, [(主命令, 命令哈希)])。
+    # base_db 与 base_entries 描述一个已写入的版本，其中未改变的命令直接复用哈希，不再重新编码。
+    def _write_tree(self, db: dict, base_db: dict = None, base_entries: List[Tuple[str, str]] = None):
+        base_hashes = dict(base_entries or [])
+        entries, chunks, chunk = [], [], []
+        for cmd, v in db.items():
+            h = base_hashes.get(cmd)
+            if h is None or base_db.get(cmd) != v:
+                h = self._put(v)
+            entries.append((cmd, h))
+            chunk.append([cmd, h])
+            if int(h[-4:], 16) & CHUNK_MASK == 0:
+                chunks.append(self._put(chunk))
+                chunk = []
+        if chunk:
+            chunks.append(self._put(chunk))
+        root = self._put({"chunks": chunks})
+        self._tree_cache = (root, entries)
+        return root, entries
+
+    def _tree_entries(self, root: str) -> List[Tuple[str, str]]:
+        if self._tree_cache and self._tree_cache[0] == root:
+            return self._tree_cache[1]
+        entries = [(cmd, h) for chunk in self._get(root)["chunks"] for cmd, h in self._get(chunk)]
+        self._tree_cache = (root, entries)
+        return entries
+
+    def load_tree(self, root: str) -> dict:
+        return {cmd: self._get(h) for cmd, h in self._tree_entries(root)}
+
+    # --- 版本日志 ---
+
+    def entries(self) -> List[dict]:
+        entries = []
+        try:
+            f = open(self.log_path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return entries
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    if isinstance(entry, dict) and isinstance(entry["version"], int) and entry["root"]:
+                        entries.append(entry)
+                except (ValueError, KeyError):
+                    continue # 跳过被截断的行（例如写入时进程被中断）
+        return entries
+
+    def _truncate_torn_tail(self):
+        # 上次追加写到一半时文件不以换行结尾，截掉残缺的最后一行，避免与新记录拼在同一行
+        try:
+            with open(self.log_path, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                if not size:
+                    return
+                f.seek(size - 1)
+                if f.read(1) == b"\n":
+                    return
+                f.seek(0)
+                f.truncate(f.read().rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+
+    def head(self) -> dict:
+        entries = self.entries()
+        return entries[-1] if entries else None
+
+    def get(self, version: int) -> dict:
+        for entry in self.entries():
+            if entry["version"] == version:
+                return entry
+        raise VersionNotFoundError(version)
+
+    def _read_stamp(self):
+        try:
+            return json.loads(self.stamp_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _write_stamp(self, version: int, stamp):
+        tmp_path = self.stamp_path.with_name(self.stamp_path.name + ".tmp")
+        tmp_path.write_text(json.dumps({"version": version, "stamp": list(stamp) if stamp else None}), encoding="utf-8")
+        os.replace(tmp_path, self.stamp_path)
+
+    def append(self, root: str, parent: int, stamp, message: str) -> dict:
+        head = self.head()
+        entry = {
+            "version": head["version"] + 1 if head else 1,
+            "root": root,
+            "parent": parent,
+            "ts": time.time(),
+            "message": message,
+        }
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self._truncate_torn_tail()
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._write_stamp(entry["version"], stamp)
+        return entry
+
+    # 确保最新版本与当前数据库文件一致：首次使用或文件在历史之外被改动过时，先把当前内容记录为一个版本
+    def sync(self, db: dict, stamp) -> dict:
+        head = self.head()
+        if head and self._read_stamp() == {"version": head["version"], "stamp": list(stamp) if stamp else None}:
+            return head
+        root, _ = self._write_tree(db)
+        if head and head["root"] == root:
+            self._write_stamp(head["version"], stamp)
+            return head
+        return self.append(root, head["version"] if head else None, stamp, "初始状态" if head is None else "外部修改")
+
+    # 记录一次修改：base_db/base_stamp 是修改前的数据库及其文件状态，db/stamp 是修改后的
+    def commit(self, db: dict, stamp, message: str, base_db: dict, base_stamp) -> dict:
+        head = self.sync(base_db, base_stamp)
+        root, _ = self._write_tree(db, base_db, self._tree_entries(head["root"]))
+        if root == head["root"]:
+            self._write_stamp(head["version"], stamp)
+            return head
+        return self.append(root, head["version"], stamp, message)
+
+    # 记录一个与已有历史无法比对的新状态（例如 fsck 修复后的数据库），不复用任何哈希
+    def record(self, db: dict, stamp, message: str) -> dict:
+        head = self.head()
+        root, _ = self._write_tree(db)
+        return self.append(root, head["version"] if head else None, stamp, message)
+
+    # 各版本相对上一条记录的主命令变化数量，用于 kvs log 展示：{version: (新增, 修改, 删除)}
+    def diff_counts(self, entries: List[dict]) -> Dict[int, Tuple[int, int, int]]:
+        counts, prev = {}, {}
+        for entry in entries:
+            try:
+                cur = dict(self._tree_entries(entry["root"]))
+            except HistoryError:
+                cur = None
+            if cur is not None:
+                added = sum(1 for cmd in cur if cmd not in prev)
+                changed = sum(1 for cmd, h in cur.items() if cmd in prev and prev[cmd] != h)
+                removed = sum(1 for cmd in prev if cmd not in cur)
+                counts[entry["version"]] = (added, changed, removed)
+                prev = cur
+        return counts
+
+    # --- 垃圾回收 ---
+
+    # 只保留最近 keep 个版本（至少保留最新版本），删除其余版本记录以及不再被引用的对象；
+    # 返回 (删除的版本数, 删除的对象数, 释放的字节数)
+    def gc(self, keep: int) -> Tuple[int, int, int]:
+        entries = self.entries()
+        kept = entries[-max(keep, 1):]
+        live = set()
+        for entry in kept:
+            root = entry["root"]
+            if root in live:
+                continue
+            live.add(root)
+            for chunk in self._get(root)["chunks"]:
+                if chunk not in live:
+                    live.add(chunk)
+                    live.update(h for _, h in self._get(chunk))
+
+        if len(kept) < len(entries):
+            tmp_path = self.log_path.with_name(self.log_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in kept)
+            os.replace(tmp_path, self.log_path)
+
+        removed, freed = 0, 0
+        if self.objects_dir.exists():
+            for sub in self.objects_dir.iterdir():
+                for path in sub.iterdir():
+                    if sub.name + path.name not in live:
+                        freed += path.stat().st_size
+                        path.unlink()
+                        removed += 1
+        self._tree_cache = None
+        return len(entries) - len(kept), removed, freed
@@ -0,0 +1,154 @@
+# src/picker.py
+import curses
+import os
+import unicodedata
+from typing import List, Tuple, Union
+
+# 全屏交互式选择器：每次按键都重新过滤命令与用法。
+#
+# 过滤是增量的：如果新查询是上一次查询的延伸（继续输入），
+# 只在上一次的候选集合里继续筛选；退格时直接复用之前缓存的结果，
+# 因此在 10 万条用法的词典上单次按键也只需要几毫秒。
+
+DEBOUNCE_MS = 10 # 连续按键（例如粘贴）期间不重绘，停顿 DEBOUNCE_MS 后再过滤和渲染；单次按键立即处理
+
+ACTIONS = {
+    "\n": "copy",      # Enter
+    "\r": "copy",
+    "\x05": "edit",    # Ctrl-E
+    "\x04": "delete",  # Ctrl-D
+}
+
+class IncrementalFilter:
+    def __init__(self, db: dict):
+        # entries 中每项为 (cmd, name, idx, usage, note)，与 find_commands 的结果格式一致
+        self.entries = []
+        self._haystacks = []
+        for cmd, v in db.items():
+            name = v.get("name") or ""
+            head = " ".join([cmd, name] + (v.get("tags") or []))
+            for idx, ex in enumerate(v.get("examples") or []):
+                usage, note = ex.get("usage") or "", ex.get("note") or ""
+                self.entries.append((cmd, name, idx, usage, note))
+                self._haystacks.append(f"{head} {usage} {note}".lower())
+        # 查询历史栈：[(query, 命中的 entry 下标列表)]，栈中每个查询都是后一个的前缀
+        self._stack = [("", list(range(len(self.entries))))]
+
+    def filter(self, query: str) -> List[int]:
+        query = query.lower()
+        # 回退到最近一个是当前查询前缀的结果（退格、改写中间字符时触发）
+        while len(self._stack) > 1 and not query.startswith(self._stack[-1][0]):
+            self._stack.pop()
+        prev_query, prev_matches = self._stack[-1]
+        if query == prev_query:
+            return prev_matches
+
+        # 上一次查询的每个关键词都是本次某个关键词的子串，只需检查新出现的关键词
+        prev_terms = set(prev_query.split())
+        terms = [t for t in query.split() if t not in prev_terms]
+        hay = self._haystacks
+        if not terms:
+            matches = prev_matches
+        elif len(terms) == 1:
+            t = terms[0]
+            matches = [i for i in prev_matches if t in hay[i]]
+        else:
+            matches = [i for i in prev_matches if all(t in hay[i] for t in terms)]
+        self._stack.append((query, matches))
+        return matches
+
+def _display_width(text: str) -> int:
+    return sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+
+def _clip(text: str, width: int) -> str:
+    # 按终端显示宽度截断（中文字符占两列）
+    if width <= 0:
+        return ""
+    out, used = [], 0
+    for c in text.replace("\n", " ").replace("\t", " "):
+        w = 2 if unicodedata.east_asian_width(c) in "WF" else 1
+        if used + w > width:
+            break
+        out.append(c)
+        used += w
+    return "".join(out)
+
+def _render(stdscr, flt: IncrementalFilter, query: str, matches: List[int], cursor: int, top: int):
+    height, width = stdscr.getmaxyx()
+    stdscr.erase()
+    rows = height - 2
+    prompt = f"> {query}"
+    status = f" {len(matches)}/{len(flt.entries)}  Enter:复制  Ctrl-E:编辑  Ctrl-D:删除  Esc:退出"
+    try:
+        stdscr.addstr(0, 0, _clip(prompt, width - 1), curses.A_BOLD)
+        stdscr.addstr(1, 0, _clip(status, width - 1), curses.A_DIM)
+        for row, pos in enumerate(range(top, min(top + rows, len(matches)))):
+            cmd, name, idx, usage, note = flt.entries[matches[pos]]
+            line = f"{cmd} [{idx}]  {usage}"
+            if note:
+                line += f"  # {note}"
+            attr = curses.A_REVERSE if pos == cursor else curses.A_NORMAL
+            stdscr.addstr(row + 2, 0, _clip(line, width - 1), attr)
+        stdscr.move(0, min(_display_width(prompt), width - 1))
+    except curses.error:
+        pass # 终端过小时忽略越界绘制
+    stdscr.refresh()
+
+def _pick(stdscr, flt: IncrementalFilter) -> Union[Tuple[str, int, str], None]:
+    curses.raw()
+    stdscr.keypad(True)
+    query, cursor, top = "", 0, 0
+    matches = flt.filter(query)
+    while True:
+        height, _ = stdscr.getmaxyx()
+        rows = max(height - 2, 1)
+        cursor = max(0, min(cursor, len(matches) - 1))
+        if cursor < top:
+            top = cursor
+        elif cursor >= top + rows:
+            top = cursor - rows + 1
+        _render(stdscr, flt, query, matches, cursor, top)
+
+        # 阻塞等待第一次按键；之后若已有待处理的按键（粘贴等连续输入），
+        # 改为在 DEBOUNCE_MS 内把后续按键一并处理完再重绘，否则立即过滤和重绘
+        stdscr.timeout(-1)
+        changed, pending = False, 0
+        while True:
+            try:
+                key = stdscr.get_wch()
+            except curses.error:
+                break # 没有更多待处理的按键
+            pending += 1
+            stdscr.timeout(DEBOUNCE_MS if pending > 1 else 0)
+            if key in ("\x1b", "\x03", "\x07"): # Esc / Ctrl-C / Ctrl-G
+                return None
+            if key in ACTIONS:
+                if changed:
+                    matches = flt.filter(query)
+                    cursor, changed = 0, False
+                if not matches:
+                    continue
+                cmd, _, idx, _, _ = flt.entries[matches[cursor]]
+                return cmd, idx, ACTIONS[key]
+            if key in (curses.KEY_UP, "\x10"): # Up / Ctrl-P
+                cursor -= 1
+            elif key in (curses.KEY_DOWN, "\x0e"): # Down / Ctrl-N
+                cursor += 1
+            elif key == curses.KEY_PPAGE:
+                cursor -= rows
+            elif key == curses.KEY_NPAGE:
+                cursor += rows
+            elif key in (curses.KEY_BACKSPACE, "\x7f", "\x08"):
+                query, changed = query[:-1], True
+            elif key == "\x15": # Ctrl-U 清空查询
+                query, changed = "", True
+            elif isinstance(key, str) and key.isprintable():
+                query, changed = query + key, True
+        if changed:
+            matches = flt.filter(query)
+            cursor, top = 0, 0
+
+# 返回 (cmd, index, action)，action 为 copy/edit/delete；用户取消时返回 None
+def run_picker(db: dict) -> Union[Tuple[str, int, str], None]:
+    os.environ.setdefault("ESCDELAY", "25") # 否则 curses 默认等待 1 秒才识别 Esc
+    return curses.wrapper(_pick, IncrementalFilter(db))
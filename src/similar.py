@@ -0,0 +1,212 @@
+# src/similar.py
+import hashlib
+import json
+import os
+import zipfile
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np # pip install numpy
+
+from src.db import get_db_path
+
+# 基于字符 n-gram 的 TF-IDF 相似度检索，完全离线、无需下载模型。
+#
+# 每条用法是一篇文档，文本由主命令、中文名、标签、用法和备注组成。
+# 英文按 3-gram 切分，中文按单字和 2-gram 切分，这样中英文混排也能匹配到相近的描述。
+#
+# 稀疏矩阵以按词排列的 CSC 形式保存在 commands.json 旁边的 similar.npz 中。
+# 文件里只存增量重建所需的原始词频（文档号按列差分后压缩），idf 和归一化权重在加载时重新计算。
+# 数据库改动后，下次检索只对内容发生变化的主命令重新切分 n-gram，其余非零项直接复用。
+
+def get_index_path():
+    return get_db_path().parent / "similar.npz"
+
+def _ngrams(text: str) -> Counter:
+    # 纯英文片段取 3-gram；含中文的片段取单字和 2-gram（中文词多为两字，单字本身也有含义）
+    text = " " + " ".join(text.lower().split()) + " "
+    grams = Counter(c for c in text if not c.isascii())
+    grams.update(g for g in (text[i:i + 2] for i in range(len(text) - 1)) if not g.isascii())
+    grams.update(g for g in (text[i:i + 3] for i in range(len(text) - 2)) if g.isascii())
+    return grams
+
+def _doc_text(cmd: str, v: dict, ex: dict) -> str:
+    # 旧版 kvs add 可能写入 "note": null，字段缺失或为 null 时都按空字符串处理
+    return " ".join([cmd, v.get("name") or "", " ".join(v.get("tags") or []), ex.get("usage") or "", ex.get("note") or ""])
+
+def _digest(cmd: str, v: dict) -> str:
+    raw = json.dumps([cmd, v], ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+def _stamp_str(stamp) -> str:
+    return f"{stamp[0]}-{stamp[1]}" if stamp else ""
+
+# 每列内的文档号与前一项做差分，数值小得多，压缩后约为原来的五分之一
+def _encode_docs(csc_ptr: np.ndarray, csc_docs: np.ndarray) -> np.ndarray:
+    deltas = np.diff(csc_docs.astype(np.int64), prepend=0)
+    starts = csc_ptr[:-1][np.diff(csc_ptr) > 0]
+    deltas[starts] = csc_docs[starts]
+    return deltas.astype(np.int32)
+
+def _decode_docs(csc_ptr: np.ndarray, deltas: np.ndarray) -> np.ndarray:
+    sums = np.cumsum(deltas, dtype=np.int64)
+    bases = np.concatenate(([0], sums))[csc_ptr[:-1]]
+    return (sums - np.repeat(bases, np.diff(csc_ptr))).astype(np.int32)
+
+_SAVED_KEYS = ("stamp", "vocab", "cmd_names", "cmd_digests", "doc_cmd", "doc_idx", "csc_ptr", "csc_counts")
+
+def _load_index() -> Dict[str, np.ndarray]:
+    try:
+        with np.load(get_index_path(), allow_pickle=False) as data:
+            index = {k: data[k] for k in _SAVED_KEYS}
+            index["csc_docs"] = _decode_docs(index["csc_ptr"], data["csc_deltas"])
+            return index
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return {} # 文件缺失、损坏或是旧格式，重新构建
+
+def _save_index(index: Dict[str, np.ndarray]):
+    index_path = get_index_path()
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    arrays = {k: index[k] for k in _SAVED_KEYS}
+    arrays["csc_deltas"] = _encode_docs(index["csc_ptr"], index["csc_docs"])
+    # 与 np.savez_compressed 格式相同，但使用最快的压缩级别，大索引也能在一秒内写完
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for k, arr in arrays.items():
+            with zf.open(k + ".npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, np.asanyarray(arr), allow_pickle=False)
+    os.replace(tmp_path, index_path)
+
+# 由原始词频计算 idf 和检索用的权重：次线性 tf * 平滑 idf，并按文档做 L2 归一化，检索时点积即为余弦相似度
+def _add_weights(index: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    csc_ptr, csc_docs = index["csc_ptr"], index["csc_docs"]
+    n_docs, df = len(index["doc_cmd"]), np.diff(csc_ptr)
+    idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+    weights = (1.0 + np.log(index["csc_counts"], dtype=np.float32)) * np.repeat(idf, df)
+    norms = np.sqrt(np.bincount(csc_docs, weights=weights * weights, minlength=n_docs)).astype(np.float32)
+    weights /= np.where(norms > 0, norms, 1.0)[csc_docs]
+    index["idf"], index["csc_weights"] = idf, weights
+    return index
+
+# 根据 db 增量更新索引。stamp 是 db 加载时 commands.json 的 (mtime_ns, size)：
+# 必须来自与 db 同一次读取，否则期间数据库被改写时，旧内容的索引会记在新文件的 stamp 下。
+# 未提供时只按各主命令的内容摘要判断是否需要重建。
+def build_index(db: dict, stamp=None) -> Dict[str, np.ndarray]:
+    stamp = _stamp_str(stamp)
+    index = _load_index()
+    if index and stamp and str(index["stamp"]) == stamp:
+        return _add_weights(index)
+
+    current = {cmd: _digest(cmd, v) for cmd, v in db.items()}
+    if index:
+        vocab_list = index["vocab"].tolist()
+        old_cmds, old_digests = index["cmd_names"].tolist(), index["cmd_digests"].tolist()
+        doc_cmd, doc_idx = index["doc_cmd"], index["doc_idx"]
+        csc_ptr, csc_docs, csc_counts = index["csc_ptr"], index["csc_docs"], index["csc_counts"]
+    else:
+        vocab_list, old_cmds, old_digests = [], [], []
+        doc_cmd, doc_idx = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        csc_ptr = np.zeros(1, dtype=np.int64)
+        csc_docs, csc_counts = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint8)
+
+    # 1. 内容未变化的主命令：按掩码保留其所有非零项，文档重新编号
+    keep_cmd = np.array([current.get(c) == d for c, d in zip(old_cmds, old_digests)], dtype=bool)
+    kept_cmds = [c for c, keep in zip(old_cmds, keep_cmd) if keep]
+    keep_doc = keep_cmd[doc_cmd] if len(doc_cmd) else np.zeros(0, dtype=bool)
+    doc_remap = (np.cumsum(keep_doc) - 1).astype(np.int32)
+    keep_nnz = keep_doc[csc_docs]
+    terms_old = np.repeat(np.arange(len(vocab_list), dtype=np.int32), np.diff(csc_ptr))
+    parts_terms, parts_docs, parts_counts = [terms_old[keep_nnz]], [doc_remap[csc_docs[keep_nnz]]], [csc_counts[keep_nnz]]
+    parts_cmd, parts_idx = [(np.cumsum(keep_cmd) - 1)[doc_cmd[keep_doc]]], [doc_idx[keep_doc]]
+
+    # 2. 新增或修改过的主命令：重新切分 n-gram，追加为新文档
+    vocab = {term: i for i, term in enumerate(vocab_list)}
+    kept_set = set(kept_cmds)
+    changed_cmds = [cmd for cmd in db if cmd not in kept_set]
+    doc = int(keep_doc.sum())
+    new_terms, new_docs, new_counts, new_cmd, new_idx = [], [], [], [], []
+    for pos, cmd in enumerate(changed_cmds, start=len(kept_cmds)):
+        v = db[cmd]
+        for idx, ex in enumerate(v.get("examples", [])):
+            for term, count in _ngrams(_doc_text(cmd, v, ex)).items():
+                term_id = vocab.get(term)
+                if term_id is None:
+                    term_id = vocab[term] = len(vocab_list)
+                    vocab_list.append(term)
+                new_terms.append(term_id)
+                new_docs.append(doc)
+                new_counts.append(min(count, 255))
+            new_cmd.append(pos)
+            new_idx.append(idx)
+            doc += 1
+    parts_terms.append(np.array(new_terms, dtype=np.int32))
+    parts_docs.append(np.array(new_docs, dtype=np.int32))
+    parts_counts.append(np.array(new_counts, dtype=np.uint8))
+    parts_cmd.append(np.array(new_cmd, dtype=np.int32))
+    parts_idx.append(np.array(new_idx, dtype=np.int32))
+
+    # 3. 合并成按词排列的 CSC；保留部分已按词有序，稳定排序（timsort）只需归并新增部分
+    terms = np.concatenate(parts_terms)
+    order = np.argsort(terms, kind="stable")
+    terms = terms[order]
+    csc_docs = np.concatenate(parts_docs)[order]
+    csc_counts = np.concatenate(parts_counts)[order]
+    n_terms = len(vocab_list)
+    csc_ptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=n_terms), out=csc_ptr[1:])
+
+    all_cmds = kept_cmds + changed_cmds
+    index = {
+        "stamp": np.array(stamp),
+        "vocab": np.array(vocab_list, dtype=str),
+        "cmd_names": np.array(all_cmds, dtype=str),
+        "cmd_digests": np.array([current[c] for c in all_cmds], dtype=str),
+        "doc_cmd": np.concatenate(parts_cmd).astype(np.int32),
+        "doc_idx": np.concatenate(parts_idx).astype(np.int32),
+        "csc_ptr": csc_ptr,
+        "csc_docs": csc_docs,
+        "csc_counts": csc_counts,
+    }
+    try:
+        _save_index(index)
+    except OSError:
+        pass # 索引只是缓存，保存失败时下次重新构建
+    return _add_weights(index)
+
+# 返回与 query 最相似的 top_k 条用法，格式与 find_commands 一致；stamp 含义同 build_index
+def find_similar(db: dict, query: str, top_k: int = 10, stamp=None) -> List[tuple]:
+    index = build_index(db, stamp)
+    vocab = {term: i for i, term in enumerate(index["vocab"].tolist())}
+    grams = _ngrams(query)
+    term_ids = np.array([vocab[t] for t in grams if t in vocab], dtype=np.int64)
+    if not len(term_ids):
+        return []
+    q_counts = np.array([grams[t] for t in grams if t in vocab], dtype=np.float32)
+    q_weights = (1.0 + np.log(q_counts)) * index["idf"][term_ids]
+    q_weights /= np.linalg.norm(q_weights)
+
+    # 稀疏点积：取出查询词对应的 CSC 列，按文档累加 q_w * d_w
+    csc_ptr, csc_docs, csc_weights = index["csc_ptr"], index["csc_docs"], index["csc_weights"]
+    starts, ends = csc_ptr[term_ids], csc_ptr[term_ids + 1]
+    lengths = ends - starts
+    nnz_pos = np.repeat(ends - np.cumsum(lengths), lengths) + np.arange(lengths.sum())
+    contrib = csc_weights[nnz_pos] * np.repeat(q_weights, lengths)
+    scores = np.bincount(csc_docs[nnz_pos], weights=contrib, minlength=len(index["doc_cmd"]))
+
+    hits = np.flatnonzero(scores > 0)
+    top_k = max(top_k, 1)
+    if len(hits) > top_k:
+        hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+    hits = hits[np.argsort(-scores[hits], kind="stable")]
+
+    cmd_names = index["cmd_names"]
+    results = []
+    for doc in hits:
+        cmd = str(cmd_names[index["doc_cmd"][doc]])
+        idx = int(index["doc_idx"][doc])
+        v = db.get(cmd)
+        if v is None or not 0 <= idx < len(v.get("examples", [])):
+            continue # 索引与 db 不一致（例如索引文件被替换），跳过失效的命中
+        ex = v["examples"][idx]
+        results.append((cmd, v.get("name") or "", idx, ex.get("usage") or "", ex.get("note") or ""))
+    return results
@@ -0,0 +1,150 @@
+# src/stats.py
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import fcntl # 仅 POSIX 可用
+except ImportError:
+    fcntl = None
+
+from src.db import get_db_path
+
+# 访问统计单独存放在 commands.json 旁边的追加式日志里，
+# 这样 copy / list / find 记录一次访问只需要追加一行，不会触发 save_db。
+#
+# 每行是一个 JSON 数组：
+#   [ts, cmd, usage]               一次访问（usage 为 null 表示访问了整个主命令）
+#   [ts, cmd, usage, score, count] 压缩后的汇总记录
+# 压缩后的文件第一行是 {"compacted_size": N}，记录压缩后汇总记录的字节数。
+# 日志增长到压缩后大小的 COMPACT_GROWTH 倍（且不小于 COMPACT_THRESHOLD）时才再次压缩，
+# 因此即使 key 很多，压缩的均摊开销也与追加量成正比。
+#
+# 追加时持有 stats.log.lock 的共享锁，压缩时持有排他锁，避免压缩期间其他进程追加的记录丢失。
+#
+# 频度分数按半衰期衰减：score(t) = score(t0) * 0.5 ** ((t - t0) / HALF_LIFE) + 1
+
+HALF_LIFE = 7 * 24 * 3600       # 一周前的访问权重减半
+COMPACT_THRESHOLD = 256 * 1024  # 日志不足该字节数时从不压缩
+COMPACT_GROWTH = 2              # 日志超过上次压缩后大小的该倍数时压缩
+
+Key = Tuple[str, str]  # (cmd, usage)，usage 为 "" 表示主命令级访问
+
+def get_stats_path():
+    return get_db_path().parent / "stats.log"
+
+def _decay(score: float, since: float, now: float) -> float:
+    if now <= since:
+        return score
+    return score * math.pow(0.5, (now - since) / HALF_LIFE)
+
+@contextmanager
+def _stats_lock(exclusive: bool):
+    if fcntl is None:
+        yield
+        return
+    stats_path = get_stats_path()
+    with open(stats_path.with_name(stats_path.name + ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _compacted_size(stats_path) -> int:
+    # 读取首行记录的上次压缩后大小；从未压缩过时返回 0
+    try:
+        with open(stats_path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+        return int(header["compacted_size"])
+    except (OSError, ValueError, TypeError, KeyError):
+        return 0
+
+# 追加访问记录；hits 为 (cmd, usage) 序列，usage 为 None 表示主命令级访问
+def record_access(hits: Iterable[Tuple[str, str]], now: float = None):
+    now = time.time() if now is None else now
+    lines = "".join(json.dumps([now, cmd, usage], ensure_ascii=False) + "\n" for cmd, usage in hits)
+    if not lines:
+        return
+    stats_path = get_stats_path()
+    try:
+        stats_path.parent.mkdir(parents=True, exist_ok=True)
+        with _stats_lock(exclusive=False):
+            with open(stats_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                size = f.tell()
+            need_compact = size > COMPACT_THRESHOLD and size > COMPACT_GROWTH * _compacted_size(stats_path)
+        if need_compact:
+            compact()
+    except OSError:
+        # 统计只是锦上添花，写失败不应影响命令本身
+        pass
+
+def _fold(now: float) -> Dict[Key, list]:
+    stats_path = get_stats_path()
+    folded: Dict[Key, list] = {}  # key -> [score, last_ts, count]
+    try:
+        f = open(stats_path, encoding="utf-8")
+    except OSError:
+        return folded
+    with f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+                if isinstance(rec, dict):
+                    continue  # 压缩后的首行元数据
+                ts, cmd, usage = rec[0], rec[1], rec[2] or ""
+                score, count = (rec[3], rec[4]) if len(rec) >= 5 else (1.0, 1)
+            except (ValueError, IndexError, TypeError):
+                continue  # 跳过被截断的行（例如写入时进程被中断）
+            entry = folded.get((cmd, usage))
+            if entry is None:
+                folded[(cmd, usage)] = [score, ts, count]
+            else:
+                entry[0] = _decay(entry[0], entry[1], ts) + score
+                entry[1] = max(entry[1], ts)
+                entry[2] += count
+    for entry in folded.values():
+        # 统一折算到 now 时刻的分数
+        entry[0] = _decay(entry[0], entry[1], now)
+        entry[1] = max(entry[1], now)
+    return folded
+
+# 返回 (cmd, usage) -> 当前频度分数
+def load_scores(now: float = None) -> Dict[Key, float]:
+    now = time.time() if now is None else now
+    return {key: entry[0] for key, entry in _fold(now).items()}
+
+# 把日志折叠成每个 key 一行的汇总记录，原子替换原文件
+def compact(now: float = None):
+    now = time.time() if now is None else now
+    stats_path = get_stats_path()
+    tmp_path = stats_path.with_name(stats_path.name + ".tmp")
+    with _stats_lock(exclusive=True):
+        records = "".join(
+            json.dumps([ts, cmd, usage or None, score, count], ensure_ascii=False) + "\n"
+            for (cmd, usage), (score, ts, count) in _fold(now).items()
+            if score >= 1e-3  # 很久没用过的条目直接丢弃
+        ).encode("utf-8")
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps({"compacted_size": len(records)}).encode("utf-8") + b"\n")
+            f.write(records)
+        os.replace(tmp_path, stats_path)
+
+def sort_commands_by_frecency(db: dict, scores: Dict[Key, float]) -> List[str]:
+    totals: Dict[str, float] = {}
+    for (cmd, _), score in scores.items():
+        totals[cmd] = totals.get(cmd, 0.0) + score
+    # sorted 是稳定排序，分数相同的保持原有顺序
+    return sorted(db.keys(), key=lambda cmd: -totals.get(cmd, 0.0))
+
+def sort_examples_by_frecency(db: dict, cmd: str, scores: Dict[Key, float]) -> List[int]:
+    exs = db.get(cmd, {}).get("examples", [])
+    return sorted(range(len(exs)), key=lambda i: -scores.get((cmd, exs[i].get("usage", "")), 0.0))
+
+def sort_results_by_frecency(results: List[tuple], scores: Dict[Key, float]) -> List[tuple]:
+    # results 中每项为 (cmd, name, idx, usage, note)
+    return sorted(results, key=lambda r: -(scores.get((r[0], r[3]), 0.0) + scores.get((r[0], ""), 0.0)))
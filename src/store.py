@@ -0,0 +1,302 @@
+# src/store.py
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Union
+
+try:
+    import fcntl # 仅 POSIX 可用，用于多进程间的写锁
+except ImportError:
+    fcntl = None
+
+from src.db import get_db_path, load_db, save_db
+from src.errors import DatabaseCorruptError, CommandNotFoundError, UsageNotFoundError, MatchesChangedError, HistoryError, HistoryRecordError
+from src.history import History
+from src import core
+
+# KVSStore：可嵌入、线程安全的 KVS 数据库封装，CLI 也构建在它之上。
+#
+# - 已发布的快照从不原地修改：事务在副本上修改，保存成功后才整体替换引用，
+#   因此 snapshot() 拿到的字典在之后的写入中保持不变（快照隔离）。
+# - 事务持有写锁，整个 with 块内的修改只做一次持久化保存；块内抛出异常则全部丢弃。
+# - 同一线程内不要嵌套事务（写锁不可重入）。
+# - 快照和事务返回的数据应视为只读，需要修改时请使用事务。
+# - history=True 时每个事务保存后都会记录一个版本（见 src/history.py），
+#   版本说明取 transaction(message) 或 history_message。
+
+class _RWLock:
+    # 写者优先的读写锁：有写者等待时，新的读者需要等待
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+# 确认后的匹配结果（find_commands 的结果）在 db 中必须仍指向同一条用法，否则说明期间数据库被改动过
+def _check_matches(db: dict, matches: List[tuple]):
+    for cmd, _, idx, usage, _ in matches:
+        exs = db.get(cmd, {}).get("examples", [])
+        if not (0 <= idx < len(exs) and exs[idx].get("usage") == usage):
+            raise MatchesChangedError()
+
+def _copy_db(db: dict) -> dict:
+    # 数据结构固定为三层，逐层复制比 copy.deepcopy 快得多；结构不符时说明文件内容已损坏，交给 fsck 处理
+    try:
+        return {
+            cmd: {**v, "tags": list(v.get("tags", [])), "examples": [dict(ex) for ex in v.get("examples", [])]}
+            for cmd, v in db.items()
+        }
+    except (TypeError, AttributeError, ValueError) as e:
+        raise DatabaseCorruptError(f"Database contains an entry that is not a valid KVS command ({e}).") from e
+
+class KVSStore:
+    def __init__(self, path: Union[str, Path] = None, history: bool = False):
+        self.path = Path(path) if path else get_db_path()
+        self.history = History(self.path) if history else None
+        self.history_message = ""
+        self._lock = _RWLock()
+        self._db = None
+        self._stamp = None
+
+    def _file_stamp(self):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _reload_if_stale(self):
+        # 调用方需持有写锁；文件被其他进程改写过时重新加载，避免覆盖别人的修改
+        stamp = self._file_stamp()
+        if self._db is None or stamp != self._stamp:
+            self._db = load_db(self.path)
+            self._stamp = stamp
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        lock_path = self.path.with_name(self.path.name + ".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # 返回当前数据库的只读快照
+    def snapshot(self) -> dict:
+        return self.snapshot_with_stamp()[0]
+
+    # 返回 (快照, 快照加载时 commands.json 的 (mtime_ns, size))，供按文件状态缓存派生数据的调用方使用
+    def snapshot_with_stamp(self) -> tuple:
+        with self._lock.read():
+            db, stamp = self._db, self._stamp
+        if db is not None and self._file_stamp() == stamp:
+            return db, stamp
+        # 首次读取，或文件已被其他进程改写
+        with self._lock.write():
+            self._reload_if_stale()
+            return self._db, self._stamp
+
+    # 保存 draft 并发布为新的快照；调用方需持有写锁和文件锁
+    def _publish(self, draft: dict):
+        save_db(draft, self.path)
+        self._db = draft
+        self._stamp = self._file_stamp()
+
+    def _record_history(self, record, *args, saved: bool = True):
+        # saved 表示数据库修改已经保存：此时历史写入失败不会回滚修改，抛出 HistoryRecordError 说明这一点
+        try:
+            return record(*args)
+        except (OSError, HistoryError) as e:
+            if saved:
+                raise HistoryRecordError(e) from e
+            if isinstance(e, HistoryError):
+                raise
+            raise HistoryError(f"读写版本历史失败: {e}") from e
+
+    @contextmanager
+    def transaction(self, message: str = None):
+        with self._lock.write(), self._file_lock():
+            self._reload_if_stale()
+            base_db, base_stamp = self._db, self._stamp
+            draft = _copy_db(self._db)
+            yield draft
+            self._publish(draft)
+            if self.history:
+                self._record_history(
+                    self.history.commit, draft, self._stamp, message or self.history_message, base_db, base_stamp
+                )
+
+    # --- 读操作 ---
+
+    def get_command(self, cmd: str) -> dict:
+        db = self.snapshot()
+        if cmd not in db:
+            raise CommandNotFoundError(cmd)
+        return db[cmd]
+
+    def get_examples(self, cmd: str) -> List[Dict]:
+        return core.get_command_examples(self.snapshot(), cmd)
+
+    def find(self, query: str) -> List[tuple]:
+        return core.find_commands(self.snapshot(), query)
+
+    def export_file(self, file_path: str, pretty: bool = False) -> bool:
+        return core.export_data(self.snapshot(), file_path, pretty)
+
+    # --- 写操作：每个方法都是一个独立事务 ---
+
+    def add(self, cmd: str, name: str, usage: str, note: str, tags: List[str] = None) -> tuple[dict, int]:
+        with self.transaction() as db:
+            return core.add_command(db, cmd, name, usage, note, tags)
+
+    def update_name(self, cmd: str, new_name: str):
+        with self.transaction() as db:
+            if not core.update_command_name(db, cmd, new_name):
+                raise CommandNotFoundError(cmd)
+
+    def update_tags(self, cmd: str, new_tags: List[str]):
+        with self.transaction() as db:
+            if not core.update_command_tags(db, cmd, new_tags):
+                raise CommandNotFoundError(cmd)
+
+    # expected_usage 为调用方按序号展示并经用户确认过的用法内容（此时 identifier 必须是序号）；
+    # 给出时在事务内核对该序号处仍是这条用法，期间数据库被改动过则抛出 MatchesChangedError 且不做任何修改
+    def delete_usage(self, cmd: str, identifier: Union[int, str], expected_usage: str = None) -> tuple[dict, bool]:
+        with self.transaction() as db:
+            if expected_usage is not None:
+                _check_matches(db, [(cmd, None, identifier, expected_usage, None)])
+            if cmd not in db:
+                raise CommandNotFoundError(cmd)
+            result = core.delete_usage(db, cmd, identifier)
+            if result is None:
+                raise UsageNotFoundError(cmd, identifier)
+            return result
+
+    def edit_usage(self, cmd: str, index: int, new_usage: str = None, new_note: str = None, expected_usage: str = None):
+        with self.transaction() as db:
+            if expected_usage is not None:
+                _check_matches(db, [(cmd, None, index, expected_usage, None)])
+            if cmd not in db:
+                raise CommandNotFoundError(cmd)
+            if not core.edit_usage(db, cmd, index, new_usage, new_note):
+                raise UsageNotFoundError(cmd, index)
+
+    def delete_matching(self, query: str) -> tuple[int, List[str]]:
+        with self.transaction() as db:
+            return core.delete_usages(db, core.find_commands(db, query))
+
+    def retag_matching(self, query: str, add_tags: List[str] = None, remove_tags: List[str] = None) -> List[str]:
+        with self.transaction() as db:
+            return core.retag_commands(db, core.find_commands(db, query), add_tags, remove_tags)
+
+    def rewrite_notes_matching(self, query: str, new_note: str) -> int:
+        with self.transaction() as db:
+            return core.rewrite_notes(db, core.find_commands(db, query), new_note)
+
+    # 以下三个方法作用于调用方已确认过的匹配结果（例如先 find 再让用户确认），
+    # 不会重新查询；期间数据库被改动导致匹配结果失效时抛出 MatchesChangedError 且不做任何修改
+
+    def delete_usages(self, matches: List[tuple]) -> tuple[int, List[str]]:
+        with self.transaction() as db:
+            _check_matches(db, matches)
+            return core.delete_usages(db, matches)
+
+    def retag_commands(self, matches: List[tuple], add_tags: List[str] = None, remove_tags: List[str] = None) -> List[str]:
+        with self.transaction() as db:
+            _check_matches(db, matches)
+            return core.retag_commands(db, matches, add_tags, remove_tags)
+
+    def rewrite_notes(self, matches: List[tuple], new_note: str) -> int:
+        with self.transaction() as db:
+            _check_matches(db, matches)
+            return core.rewrite_notes(db, matches, new_note)
+
+    def import_file(self, file_path: str, overwrite: bool = False) -> tuple[int, int]:
+        with self.transaction() as db:
+            _, new_cmd_count, merged_count = core.import_data(db, file_path, overwrite)
+            return new_cmd_count, merged_count
+
+    # 用 db_data 整体替换数据库，不读取现有文件（用于 fsck 修复无法加载的数据库）
+    def replace(self, db_data: dict, message: str = None):
+        with self._lock.write(), self._file_lock():
+            self._publish(_copy_db(db_data))
+            if self.history:
+                self._record_history(self.history.record, self._db, self._stamp, message or self.history_message)
+
+    # --- 版本历史：需要以 history=True 创建 ---
+
+    def _require_history(self) -> History:
+        if self.history is None:
+            raise HistoryError("未启用版本历史，请以 KVSStore(history=True) 创建。")
+        return self.history
+
+    # 撤销最近一次修改：恢复到最新版本的 parent，新记录的 parent 沿用目标版本的 parent，便于连续撤销
+    def undo(self) -> dict:
+        history = self._require_history()
+        with self._lock.write(), self._file_lock():
+            self._reload_if_stale()
+            head = self._record_history(history.sync, self._db, self._stamp, saved=False)
+            if head["parent"] is None:
+                raise HistoryError("没有可以撤销的修改。")
+            target = history.get(head["parent"])
+            self._publish(history.load_tree(target["root"]))
+            return self._record_history(
+                history.append, target["root"], target["parent"], self._stamp, f"undo（回到版本 {target['version']}）"
+            )
+
+    # 切换到指定版本；新记录的 parent 是切换前的版本，因此 checkout 本身也可以 undo
+    def checkout(self, version: int) -> dict:
+        history = self._require_history()
+        with self._lock.write(), self._file_lock():
+            self._reload_if_stale()
+            head = self._record_history(history.sync, self._db, self._stamp, saved=False)
+            target = history.get(version)
+            if target["root"] == head["root"]:
+                return head
+            self._publish(history.load_tree(target["root"]))
+            return self._record_history(
+                history.append, target["root"], head["version"], self._stamp, f"checkout {version}"
+            )
+
+    def log(self, limit: int = None) -> List[dict]:
+        entries = self._require_history().entries()
+        return entries[-limit:] if limit else entries
+
+    def gc_history(self, keep: int) -> tuple[int, int, int]:
+        history = self._require_history()
+        with self._lock.write(), self._file_lock():
+            return history.gc(keep)
@@ -46,6 +46,16 @@ def run_kvs_command(temp_data_dir: str, args: list, input_str: str = None) -> tu
     
     return process.stdout, process.stderr, process.returncode
 
+def run_kvs_script(temp_data_dir: str, script: str) -> tuple[str, str, int]:
+    """在指定的临时数据目录下运行一段直接调用 kvs 模块的 Python 脚本。"""
+    env = os.environ.copy()
+    env["XDG_DATA_HOME"] = temp_data_dir
+    process = subprocess.run(["python3", "-c", script], env=env, text=True, capture_output=True, check=False)
+    print(f"  Return code: {process.returncode}")
+    if process.stderr:
+        print(f"  Stderr:\n{process.stderr.strip()}")
+    return process.stdout, process.stderr, process.returncode
+
 def get_db_content(temp_data_dir: str) -> dict:
     """从临时数据目录读取当前的 commands.json 文件内容。"""
     # 根据 kvs 的 XDG 规范，数据文件通常在 $XDG_DATA_HOME/kvs/commands.json
@@ -162,6 +172,349 @@ def run_tests():
         assert "intercmd" not in db_content, "测试失败: 交互式删除未移除命令。"
         print("测试 12: 通过。")
 
+        print("\n--- 测试 13: 按使用频度排序 (--sort frecency) ---")
+        run_kvs_command(temp_dir, ["add", "freq", "频度", "freq alpha", "第一条"])
+        run_kvs_command(temp_dir, ["add", "freq", "频度", "freq beta", "第二条"])
+        db_path = os.path.join(temp_dir, "kvs", "commands.json")
+        db_mtime = os.path.getmtime(db_path)
+        run_kvs_command(temp_dir, ["find", "beta"])
+        run_kvs_command(temp_dir, ["find", "beta"])
+        assert os.path.getmtime(db_path) == db_mtime, "测试失败: 记录访问统计时不应改写 commands.json。"
+        assert os.path.exists(os.path.join(temp_dir, "kvs", "stats.log")), "测试失败: 访问统计文件未创建。"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["list", "freq", "--sort", "frecency"])
+        assert retcode == 0 and stdout.index("freq beta") < stdout.index("freq alpha"), f"测试失败: 频度排序不正确。Stdout: {stdout}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["list", "--sort", "frecency"])
+        assert retcode == 0 and stdout.index("freq") < stdout.index("mycmd"), f"测试失败: 主命令频度排序不正确。Stdout: {stdout}"
+        # key 很多、压缩后仍超过阈值时，后续少量追加不应再次触发压缩
+        stdout, stderr, retcode = run_kvs_script(temp_dir, (
+            "import os\n"
+            "from src import stats\n"
+            "stats.COMPACT_THRESHOLD = 1024\n"
+            "stats.record_access([('bulk%d' % i, 'bulk%d --run' % i) for i in range(200)])\n"
+            "path = stats.get_stats_path()\n"
+            "compacted = stats._compacted_size(path)\n"
+            "stats.record_access([('bulk0', 'bulk0 --run')] * 5)\n"
+            "print(compacted > 1024, stats._compacted_size(path) == compacted, os.path.getsize(path) > compacted)\n"
+        ))
+        assert stdout.split() == ["True", "True", "True"], f"测试失败: 压缩触发条件不正确。Stdout: {stdout}, Stderr: {stderr}"
+        print("测试 13: 通过。")
+
+        print("\n--- 测试 14: 非交互终端下运行 kvs pick ---")
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["pick"])
+        assert "交互式终端" in stdout and retcode == 0, f"测试失败: pick 未拒绝非终端输入。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_script(temp_dir, (
+            "from src.picker import IncrementalFilter\n"
+            "db = {\n"
+            "    'git': {'name': '版本', 'tags': ['dev'], 'examples': [\n"
+            "        {'usage': 'git branch -a', 'note': '远程分支'}, {'usage': 'git log', 'note': None}]},\n"
+            "    'ls': {'name': '列文件', 'tags': [], 'examples': [{'usage': 'ls -la', 'note': '全部'}]},\n"
+            "}\n"
+            "flt = IncrementalFilter(db)\n"
+            "usages = lambda m: [flt.entries[i][3] for i in m]\n"
+            "first = flt.filter('g')\n"
+            "print(usages(first))\n"
+            "print(usages(flt.filter('gi')))\n"
+            "print(flt.filter('g') is first)\n" # 退格复用缓存结果
+            "print(usages(flt.filter('dev 分支')))\n"
+            "print(usages(flt.filter('none')))\n"
+        ))
+        assert stdout.splitlines() == [
+            "['git branch -a', 'git log']", "['git branch -a', 'git log']", "True", "['git branch -a']", "[]",
+        ], f"测试失败: IncrementalFilter 过滤结果不正确。Stdout: {stdout}, Stderr: {stderr}"
+        print("测试 14: 通过。")
+
+        print("\n--- 测试 15: 相似度检索 (find --similar) ---")
+        run_kvs_command(temp_dir, ["add", "ss", "套接字", "ss -tlnp", "查看监听端口"])
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["find", "--similar", "监听的端口", "--top", "1"])
+        assert retcode == 0 and "ss -tlnp" in stdout and "freq" not in stdout, f"测试失败: 相似度检索结果不正确。Stdout: {stdout}, Stderr: {stderr}"
+        run_kvs_command(temp_dir, ["add", "lsof", "打开文件", "lsof -i :8080", "list open ports"])
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["find", "--similar", "open port", "--top", "1"])
+        assert retcode == 0 and "lsof -i :8080" in stdout, f"测试失败: 增量重建索引后未找到新用法。Stdout: {stdout}, Stderr: {stderr}"
+        # 旧版 kvs add 写入的 "note": null 不应导致检索失败
+        run_kvs_script(temp_dir, (
+            "from src.db import load_db, save_db\n"
+            "db = load_db()\n"
+            "db['nullnote'] = {'name': None, 'tags': None, 'examples': [{'usage': 'nullnote --serve', 'note': None}]}\n"
+            "save_db(db)\n"
+        ))
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["find", "--similar", "nullnote serve", "--top", "1"])
+        assert retcode == 0 and "nullnote --serve" in stdout, f"测试失败: null 备注导致相似度检索失败。Stdout: {stdout}, Stderr: {stderr}"
+        run_kvs_script(temp_dir, (
+            "from src.db import load_db, save_db\n"
+            "db = load_db()\n"
+            "del db['nullnote']\n"
+            "save_db(db)\n"
+        ))
+        # 用旧快照建索引时数据库已被改写：索引必须记在旧快照的 stamp 下，新数据库上的检索会重建而不是越界；
+        # 与 db 不一致的命中直接跳过
+        stdout, stderr, retcode = run_kvs_script(temp_dir, (
+            "from src.store import KVSStore\n"
+            "from src.db import load_db, save_db\n"
+            "from src.similar import build_index, find_similar\n"
+            "old_db, old_stamp = KVSStore().snapshot_with_stamp()\n"
+            "db = load_db()\n"
+            "del db['lsof']\n"
+            "save_db(db)\n"
+            "build_index(old_db, old_stamp)\n"
+            "new_db, new_stamp = KVSStore().snapshot_with_stamp()\n"
+            "print([r[0] for r in find_similar(new_db, 'open port', 5, new_stamp)].count('lsof'))\n"
+            "build_index(old_db, new_stamp)\n"
+            "print([r[0] for r in find_similar(new_db, 'open port', 5, new_stamp)].count('lsof'))\n"
+        ))
+        assert retcode == 0 and stdout.split() == ["0", "0"], f"测试失败: 过期索引导致相似度检索出错。Stdout: {stdout}, Stderr: {stderr}"
+        print("测试 15: 通过。")
+
+        print("\n--- 测试 16: kvs list 渲染缓存 ---")
+        cold_stdout, _, _ = run_kvs_command(temp_dir, ["list"])
+        cache_dir = os.path.join(temp_dir, "kvs", "render_cache")
+        assert os.listdir(cache_dir), "测试失败: 未生成渲染缓存。"
+        warm_stdout, stderr, retcode = run_kvs_command(temp_dir, ["list"])
+        assert retcode == 0 and warm_stdout == cold_stdout, f"测试失败: 缓存输出与首次渲染不一致。Stdout: {warm_stdout}"
+        run_kvs_command(temp_dir, ["add", "cachecmd", "缓存命令", "cachecmd --run", "新增后缓存应失效"])
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["list"])
+        assert retcode == 0 and "cachecmd" in stdout, f"测试失败: 保存后渲染缓存未失效。Stdout: {stdout}"
+        color_env = dict(os.environ, XDG_DATA_HOME=temp_dir, FORCE_COLOR="1")
+        subprocess.run(["python3", "-m", "src.cli", "list"], env=color_env, capture_output=True, check=False)
+        no_color = subprocess.run(["python3", "-m", "src.cli", "list"], env=dict(color_env, NO_COLOR="1"),
+                                  text=True, capture_output=True, check=False).stdout
+        assert "\x1b[1;36m" not in no_color, "测试失败: NO_COLOR 时命中了带颜色的渲染缓存。"
+        # 渲染期间数据库被其他进程保存：旧快照的输出只能缓存在旧版本的键下
+        run_kvs_script(temp_dir, (
+            "from src.store import KVSStore\n"
+            "from src.display import show_main_cmds\n"
+            "old_db, old_stamp = KVSStore().snapshot_with_stamp()\n"
+            "KVSStore().add('racecmd', '竞争', 'racecmd --go', '')\n"
+            "show_main_cmds(old_db, stamp=old_stamp)\n"
+        ))
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["list"])
+        assert retcode == 0 and "racecmd" in stdout, f"测试失败: 旧快照的渲染结果被缓存在新版本下。Stdout: {stdout}"
+        run_kvs_command(temp_dir, ["delete", "racecmd", "0"], input_str="y\n")
+        print("测试 16: 通过。")
+
+        print("\n--- 测试 17: 按查询批量修改与删除 (--match) ---")
+        run_kvs_command(temp_dir, ["add", "oldtool", "旧工具", "oldtool run", "已废弃"])
+        run_kvs_command(temp_dir, ["add", "cachecmd", "缓存命令", "cachecmd --legacy", "已废弃"])
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["retag", "--match", "已废弃", "--add", "legacy", "--yes"])
+        assert "已更新 2 个主命令的标签" in stdout and retcode == 0, f"测试失败: 批量修改标签失败。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["edit", "--match", "已废弃", "--new-note", "即将删除", "--yes"])
+        assert "已将 2 条用法的备注改写" in stdout and retcode == 0, f"测试失败: 批量改写备注失败。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["delete", "--match", "即将删除"], input_str="y\n")
+        assert "已删除 2 条" in stdout and retcode == 0, f"测试失败: 批量删除失败。Stdout: {stdout}, Stderr: {stderr}"
+        db_content = get_db_content(temp_dir)
+        assert "oldtool" not in db_content, "测试失败: 用法删空后未自动移除主命令。"
+        assert [ex["usage"] for ex in db_content["cachecmd"]["examples"]] == ["cachecmd --run"], "测试失败: 批量删除结果不正确。"
+        assert "legacy" in db_content["cachecmd"]["tags"], "测试失败: 标签未被批量添加。"
+        # 确认后数据库被其他进程改动时，批量删除应放弃而不是删除另一批用法
+        stdout, stderr, retcode = run_kvs_script(temp_dir, (
+            "from src.store import KVSStore\n"
+            "from src.errors import MatchesChangedError\n"
+            "store = KVSStore()\n"
+            "store.add('stale', '过期', 'stale one', '')\n"
+            "results = store.find('stale')\n"
+            "KVSStore().delete_usage('stale', 0)\n"
+            "KVSStore().add('stale', '过期', 'stale two', '')\n"
+            "try:\n"
+            "    store.delete_usages(results)\n"
+            "except MatchesChangedError:\n"
+            "    print('aborted', [ex['usage'] for ex in store.get_examples('stale')])\n"
+            "store.delete_usages(store.find('stale'))\n"
+        ))
+        assert stdout.strip() == "aborted ['stale two']", f"测试失败: 匹配结果变化后未放弃批量删除。Stdout: {stdout}, Stderr: {stderr}"
+        # 单条删除/编辑同样核对确认过的用法：序号处已换成另一条用法时放弃
+        stdout, stderr, retcode = run_kvs_script(temp_dir, (
+            "from src.store import KVSStore\n"
+            "from src.errors import MatchesChangedError\n"
+            "store = KVSStore()\n"
+            "store.add('single', '单条', 'single one', '')\n"
+            "KVSStore().delete_usage('single', 0)\n"
+            "KVSStore().add('single', '单条', 'single two', '')\n"
+            "for action in (lambda: store.delete_usage('single', 0, 'single one'),\n"
+            "               lambda: store.edit_usage('single', 0, 'single edited', None, 'single one')):\n"
+            "    try:\n"
+            "        action()\n"
+            "    except MatchesChangedError:\n"
+            "        print('aborted')\n"
+            "store.edit_usage('single', 0, 'single edited', None, 'single two')\n"
+            "print([ex['usage'] for ex in store.get_examples('single')])\n"
+            "store.delete_usage('single', 0, 'single edited')\n"
+            "print('single' in store.snapshot())\n"
+        ))
+        assert stdout.split("\n")[:4] == ["aborted", "aborted", "['single edited']", "False"], f"测试失败: 单条用法变化后未放弃删除/编辑。Stdout: {stdout}, Stderr: {stderr}"
+        # 旧版 kvs add 写入的 "note": null 不应导致查找、按关键词删除或批量操作失败
+        run_kvs_script(temp_dir, (
+            "from src.db import load_db, save_db\n"
+            "db = load_db()\n"
+            "db['nulltool'] = {'name': '空备注', 'tags': [], 'examples': [\n"
+            "    {'usage': 'nulltool a', 'note': None}, {'usage': 'nulltool b', 'note': None}, {'usage': 'nulltool c', 'note': None}]}\n"
+            "save_db(db)\n"
+        ))
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["find", "nulltool"])
+        assert retcode == 0 and "nulltool c" in stdout, f"测试失败: null 备注导致查找失败。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["retag", "--match", "tool", "--add", "nullnote", "--yes"])
+        assert retcode == 0 and "已更新" in stdout, f"测试失败: null 备注导致批量修改标签失败。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["delete", "nulltool", "tool b"], input_str="y\n")
+        assert retcode == 0 and "已删除 'nulltool' 的用法" in stdout, f"测试失败: null 备注导致按关键词删除失败。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["delete", "--match", "nulltool", "--yes"])
+        assert retcode == 0 and "已删除 2 条" in stdout, f"测试失败: null 备注导致批量删除失败。Stdout: {stdout}, Stderr: {stderr}"
+        assert "nulltool" not in get_db_content(temp_dir), "测试失败: null 备注的用法未被批量删除。"
+        print("测试 17: 通过。")
+
+        print("\n--- 测试 18: KVSStore 多线程并发写入 ---")
+        # 8 个线程各添加 25 条用法，并有一个事务中途抛出异常，检查既不丢写也不残留半个事务
+        store_script = (
+            "import threading\n"
+            "from src.store import KVSStore\n"
+            "store = KVSStore()\n"
+            "def worker(n):\n"
+            "    for i in range(25):\n"
+            "        store.add('threaded', '并发', f'threaded {n}-{i}', '')\n"
+            "threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]\n"
+            "[t.start() for t in threads]\n"
+            "[t.join() for t in threads]\n"
+            "try:\n"
+            "    with store.transaction() as db:\n"
+            "        db['threaded']['examples'].clear()\n"
+            "        raise RuntimeError('abort')\n"
+            "except RuntimeError:\n"
+            "    pass\n"
+            "print(len(store.get_examples('threaded')))\n"
+        )
+        stdout, stderr, retcode = run_kvs_script(temp_dir, store_script)
+        assert retcode == 0 and stdout.strip() == "200", f"测试失败: 并发写入结果不正确。Stdout: {stdout}, Stderr: {stderr}"
+        assert len(get_db_content(temp_dir)["threaded"]["examples"]) == 200, "测试失败: 并发写入未全部持久化。"
+        print("测试 18: 通过。")
+
+        print("\n--- 测试 19: 紧凑存储与 export --pretty ---")
+        with open(os.path.join(temp_dir, "kvs", "commands.json"), 'r', encoding='utf-8') as f:
+            assert "\n" not in f.read().strip(), "测试失败: commands.json 未以紧凑格式保存。"
+        pretty_path = os.path.join(temp_dir, "pretty.json")
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["export", pretty_path, "--pretty"])
+        assert "成功导出" in stdout and retcode == 0, f"测试失败: 无法导出带缩进的 JSON。Stdout: {stdout}, Stderr: {stderr}"
+        with open(pretty_path, 'r', encoding='utf-8') as f:
+            pretty_text = f.read()
+        assert '\n  "mycmd": {' in pretty_text and json.loads(pretty_text) == get_db_content(temp_dir), "测试失败: --pretty 导出内容不正确。"
+        stdout, stderr, retcode = run_kvs_script(temp_dir, (
+            "import json, tempfile\n"
+            "from pathlib import Path\n"
+            "from src.db import load_db_typed, AVAILABLE_CODECS\n"
+            "path = Path(tempfile.mkdtemp()) / 'commands.json'\n"
+            "path.write_text(json.dumps({'a': {'name': 'b', 'tags': [], 'examples': [{'usage': 'a -x', 'note': None}]}}))\n"
+            "print({load_db_typed(path, codec)['a'].examples[0].note for codec in [None] + AVAILABLE_CODECS})\n"
+        ))
+        assert stdout.strip() == "{''}", f"测试失败: 类型化加载未将 null 备注规整为空字符串。Stdout: {stdout}, Stderr: {stderr}"
+        print("测试 19: 通过。")
+
+        print("\n--- 测试 20: fsck 检查与修复损坏的数据库 ---")
+        db_file = os.path.join(temp_dir, "kvs", "commands.json")
+        good_db = get_db_content(temp_dir)
+        good_db["broken"] = {"name": "坏", "tags": [], "examples": [{"usage": "broken -x", "note": ""}]}
+        good_db["badtags"] = {"name": "标签", "tags": ["ok", 1], "examples": [{"usage": "badtags"}]}
+        parts = [json.dumps(cmd, ensure_ascii=False) + ":" + json.dumps(v, ensure_ascii=False) for cmd, v in good_db.items()]
+        parts[-2] = parts[-2][:-10] # 截断 broken 这一项
+        corrupt_text = "{" + ",".join(parts) + "}"
+        with open(db_file, 'w', encoding='utf-8') as f:
+            f.write(corrupt_text)
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["add", "newcmd", "新", "newcmd -a"])
+        assert "kvs fsck" in stdout, f"测试失败: 数据库损坏时未提示运行 fsck。Stdout: {stdout}, Stderr: {stderr}"
+        with open(db_file, 'r', encoding='utf-8') as f:
+            assert f.read() == corrupt_text, "测试失败: 加载失败后数据库被改写。"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["fsck"])
+        assert "损坏区域: 1" in stdout and "--repair" in stdout, f"测试失败: fsck 未报告损坏。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["fsck", "--repair"])
+        assert "数据库已修复" in stdout, f"测试失败: fsck --repair 失败。Stdout: {stdout}, Stderr: {stderr}"
+        repaired_db = get_db_content(temp_dir)
+        expected_db = {cmd: v for cmd, v in good_db.items() if cmd != "broken"}
+        expected_db["badtags"] = {"name": "标签", "tags": ["ok"], "examples": [{"usage": "badtags", "note": ""}]}
+        assert repaired_db == expected_db, f"测试失败: 修复后的数据不正确: {repaired_db}"
+        backups = [name for name in os.listdir(os.path.join(temp_dir, "kvs")) if name.startswith("commands.json.bak-")]
+        assert len(backups) == 1, "测试失败: 修复前未备份原文件。"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["fsck"])
+        assert "数据库完好" in stdout, f"测试失败: 修复后 fsck 仍报告问题。Stdout: {stdout}, Stderr: {stderr}"
+        # 合法文本中的 U+FFFD 不是损坏，真正的非法字节才是
+        stdout, stderr, retcode = run_kvs_script(temp_dir, (
+            "import tempfile\n"
+            "from pathlib import Path\n"
+            "from src.fsck import check_db_file\n"
+            "path = Path(tempfile.mkdtemp()) / 'commands.json'\n"
+            "path.write_bytes('{\"a\":{\"name\":\"\\ufffd\",\"tags\":[],\"examples\":[{\"usage\":\"a\",\"note\":\"\"}]}}'.encode('utf-8'))\n"
+            "print(check_db_file(path).clean)\n"
+            "path.write_bytes(b'{\"a\":{\"name\":\"\\xff\",\"tags\":[],\"examples\":[{\"usage\":\"a\",\"note\":\"\"}]}}')\n"
+            "print(len(check_db_file(path).corrupt_regions))\n"
+        ))
+        assert stdout.split() == ["True", "1"], f"测试失败: UTF-8 损坏检测不正确。Stdout: {stdout}, Stderr: {stderr}"
+        print("测试 20: 通过。")
+
+        print("\n--- 测试 21: 版本历史 log / undo / checkout / gc ---")
+        before_db = get_db_content(temp_dir)
+        run_kvs_command(temp_dir, ["add", "histcmd", "历史", "histcmd --one"])
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["delete", "--match", "histcmd", "--yes"])
+        assert "histcmd" not in get_db_content(temp_dir), f"测试失败: 批量删除未生效。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["undo"])
+        assert "已撤销" in stdout, f"测试失败: undo 失败。Stdout: {stdout}, Stderr: {stderr}"
+        assert get_db_content(temp_dir)["histcmd"]["examples"] == [{"usage": "histcmd --one", "note": ""}], "测试失败: undo 未恢复被删除的命令。"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["undo"])
+        assert get_db_content(temp_dir) == before_db, "测试失败: 连续 undo 未回到更早的版本。"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["log", "-n", "0"])
+        assert "版本历史" in stdout and "undo" in stdout, f"测试失败: log 未列出修改记录。Stdout: {stdout}"
+        with open(os.path.join(temp_dir, "kvs", "history", "log.jsonl"), 'r', encoding='utf-8') as f:
+            versions = [json.loads(line) for line in f]
+        messages = [v["message"] for v in versions]
+        assert "kvs delete --match histcmd --yes" in messages and "kvs fsck --repair" in messages, f"测试失败: 版本记录不完整: {messages}"
+        add_version = next(v["version"] for v in versions if v["message"].startswith("kvs add histcmd"))
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["checkout", str(add_version)])
+        assert "histcmd" in get_db_content(temp_dir), f"测试失败: checkout 未恢复到指定版本。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["gc", "--keep", "1"])
+        assert "已清理" in stdout, f"测试失败: gc 失败。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["undo"])
+        assert "未找到版本" in stdout and "histcmd" in get_db_content(temp_dir), f"测试失败: gc 后 undo 行为不正确。Stdout: {stdout}"
+        # 追加写到一半中断留下的残缺行不应影响后续修改、log 与 undo
+        with open(os.path.join(temp_dir, "kvs", "history", "log.jsonl"), 'a', encoding='utf-8') as f:
+            f.write('{"version": 99, "ro')
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["add", "torncmd", "残缺", "torncmd --go"])
+        assert "已成功添加" in stdout, f"测试失败: 历史日志残缺时添加失败。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["undo"])
+        assert "已撤销" in stdout and "torncmd" not in get_db_content(temp_dir), f"测试失败: 历史日志残缺时 undo 失败。Stdout: {stdout}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["log"])
+        assert "版本历史" in stdout, f"测试失败: 历史日志残缺时 log 失败。Stdout: {stdout}"
+        print("测试 21: 通过。")
+
+        print("\n--- 测试 22: 导入数据 (import) ---")
+        import_path = os.path.join(temp_dir, "import.json")
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["import", os.path.join(temp_dir, "missing.json")])
+        assert retcode == 0 and "无法导入" in stdout and "文件不存在" in stdout, f"测试失败: 导入不存在的文件时提示不正确。Stdout: {stdout}, Stderr: {stderr}"
+        with open(import_path, "w", encoding="utf-8") as f:
+            json.dump(["not", "a", "database"], f)
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["import", import_path])
+        assert retcode == 0 and "不是 KVS 数据库格式" in stdout and "未知错误" not in stdout, f"测试失败: 导入格式错误的文件时提示不正确。Stdout: {stdout}, Stderr: {stderr}"
+        with open(import_path, "w", encoding="utf-8") as f:
+            json.dump({"imported": {"name": "导入", "tags": [], "examples": [{"usage": "imported --run", "note": ""}]}}, f)
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["import", import_path])
+        assert retcode == 0 and "成功导入" in stdout and "imported" in get_db_content(temp_dir), f"测试失败: 导入失败。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["export", os.path.join(temp_dir, "no_such_dir", "out.json")])
+        assert retcode == 0 and "无法导出到" in stdout, f"测试失败: 导出失败时提示不正确。Stdout: {stdout}, Stderr: {stderr}"
+        # 无法修复的条目拒绝整个文件，能修复的条目修复后导入，之后的修改不受影响
+        with open(import_path, "w", encoding="utf-8") as f:
+            json.dump({"bad": 1, "goodimport": {"name": "好", "tags": [], "examples": [{"usage": "goodimport", "note": ""}]}}, f)
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["import", import_path])
+        db_content = get_db_content(temp_dir)
+        assert "'bad'" in stdout and "bad" not in db_content and "goodimport" not in db_content, f"测试失败: 未拒绝格式错误的导入条目。Stdout: {stdout}, Stderr: {stderr}"
+        with open(import_path, "w", encoding="utf-8") as f:
+            json.dump({"fiximport": {"name": "修复", "tags": ["ok", 1], "examples": [{"usage": "fiximport", "note": None}]}}, f)
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["import", import_path])
+        assert "成功导入" in stdout and get_db_content(temp_dir)["fiximport"]["tags"] == ["ok"], f"测试失败: 可修复的导入条目未被修复。Stdout: {stdout}, Stderr: {stderr}"
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["add", "fiximport", "修复", "fiximport --again", ""])
+        assert retcode == 0 and "成功添加" in stdout, f"测试失败: 导入后无法继续修改。Stdout: {stdout}, Stderr: {stderr}"
+        # 数据库文件本身含有非对象条目时，修改应报告数据库损坏而不是抛出原始 TypeError
+        db_content = get_db_content(temp_dir)
+        db_content["bad"] = 1
+        with open(os.path.join(temp_dir, "kvs", "commands.json"), "w", encoding="utf-8") as f:
+            json.dump(db_content, f)
+        stdout, stderr, retcode = run_kvs_command(temp_dir, ["add", "fiximport", "修复", "fiximport --third", ""])
+        assert "数据库未做任何修改" in stdout and "未知错误" not in stdout, f"测试失败: 损坏条目未报告为数据库损坏。Stdout: {stdout}, Stderr: {stderr}"
+        run_kvs_command(temp_dir, ["fsck", "--repair"])
+        assert "bad" not in get_db_content(temp_dir), "测试失败: fsck 未移除损坏条目。"
+        print("测试 22: 通过。")
+
         print("\n--- 所有测试通过！ ---")
 
     except AssertionError as e: